@@ -1,21 +1,49 @@
-from flask import Flask, render_template, request, jsonify, g
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 import pyodbc
-from datetime import datetime
-from utils import get_db_connection, log_change
-from routes import location_routes
+import json
+import time
+from datetime import date, datetime, timedelta
+import audit
+from db_pool import get_pool, get_db, close_db, rollback_db, request_stats
+import config
+import compression
+from cache import SnapshotCache, TTLCache, register, invalidate
+from etags import conditional
+from exports import EXPORT_FORMATS, iter_export
+from serializers import RawJSON, columns_of, encode_rows, json_response
+from search import inventory_index, get_index as get_search_index, preload as preload_search_index
+import suggest
+from audit_archive import ROW_COLUMNS as AUDIT_COLUMNS, audit_archive
+from overdue import overdue_loaners
+from pagination import SortKey, encode_cursor, decode_cursor, seek_predicate, order_by, parse_sort
+from hardware_query import HARDWARE_FIELDS, HARDWARE_FILTERS, HARDWARE_SORT_KEYS, HARDWARE_SORTABLE
+from routes import location_routes, loaner_routes, event_routes
+from events import publish
 
 app = Flask(__name__)
+compression.init_app(app)
 app.register_blueprint(location_routes.bp)
+app.register_blueprint(loaner_routes.loaner_bp)
+app.register_blueprint(event_routes.events_bp)
 
-@app.before_request
-def before_request():
-    g.db = get_db_connection()
+if config.SEARCH_INDEX_PRELOAD and config.DATABASE_URL:
+    preload_search_index()
+    suggest.preload()
+
+if config.AUDIT_MODE == 'spool':
+    audit.get_spool().start()  # drain anything left from before a restart
+
+if config.OVERDUE_JOB and config.DATABASE_URL:
+    overdue_loaners.start()
+
+# Total counts for /api/hardware keyed by filter; cleared by inventory and location writes
+hardware_counts = register(TTLCache(config.COUNT_CACHE_TTL), 'hardware', 'locations')
+# /api/hardware/facets results keyed by filter, cleared by the same writes
+hardware_facets = register(TTLCache(config.COUNT_CACHE_TTL), 'hardware', 'locations')
 
 @app.teardown_request
 def teardown_request(exception):
-    db = getattr(g, 'db', None)
-    if db is not None:
-        db.close()
+    close_db(exception)
 
 @app.route('/')
 def index():
@@ -24,7 +52,7 @@ def index():
 @app.route('/api/test-db')
 def test_db():
     try:
-        cursor = g.db.cursor()
+        cursor = get_db().cursor()
         cursor.execute("SELECT TOP 1 * FROM dbo.Formatted_Company_Inventory")
         result = cursor.fetchone()
         return jsonify({
@@ -38,52 +66,69 @@ def test_db():
             'error': str(e)
         }), 500
 
+@app.route('/api/db/stats')
+def db_stats():
+    stats = get_pool().stats()
+    stats.update(request_stats())
+    stats['audit'] = audit.stats()
+    stats['audit_archive'] = audit_archive.stats()
+    stats['overdue_loaners'] = overdue_loaners.stats()
+    return jsonify(stats)
+
 @app.route('/api/locations', methods=['GET'])
+@conditional('locations')
 def get_locations():
     try:
-        cursor = g.db.cursor()
-        cursor.execute("""
-            SELECT 
-                location_id,
-                site_name,
-                room_number,
-                room_name,
-                room_type
-            FROM dbo.Locations
-            ORDER BY site_name, room_number
-        """)
-        
-        columns = [column[0] for column in cursor.description]
-        results = []
-        
-        for row in cursor.fetchall():
-            results.append(dict(zip(columns, row)))
-            
-        return jsonify(results)
+        return json_response(RawJSON(locations_cache.get()['locations_json']))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/locations/types', methods=['GET'])
+@conditional('locations')
 def get_room_types():
     try:
-        cursor = g.db.cursor()
-        cursor.execute("""
-            SELECT DISTINCT room_type
-            FROM dbo.Locations
-            ORDER BY room_type
-        """)
-        
-        types = [row[0] for row in cursor.fetchall()]
-        return jsonify(types)
+        return json_response(locations_cache.get()['room_types'])
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _load_locations():
+    """Read dbo.Locations once and derive everything the location endpoints serve"""
+    cursor = get_db().cursor()
+    cursor.execute("""
+        SELECT 
+            location_id,
+            site_name,
+            room_number,
+            room_name,
+            room_type
+        FROM dbo.Locations
+        ORDER BY site_name, room_number
+    """)
+    columns = columns_of(cursor)
+    rows = cursor.fetchall()
+    
+    # Same result as SELECT DISTINCT ... ORDER BY under the default case-insensitive collation
+    room_types = {}
+    for row in rows:
+        room_type = row[columns.index('room_type')]
+        if room_type is not None:
+            room_types.setdefault(room_type.casefold(), room_type)
+    
+    return {
+        'rows': rows,
+        'locations_json': encode_rows(columns, rows),
+        'room_types': [room_types[key] for key in sorted(room_types)]
+    }
+
+# The whole (small, rarely changing) Locations table; cleared by the location write routes
+locations_cache = register(SnapshotCache(_load_locations, config.LOCATIONS_CACHE_TTL), 'locations')
+
 @app.route('/api/hardware/<asset_tag>/toggle-loaner', methods=['POST'])
 def toggle_loaner_status(asset_tag):
     try:
-        cursor = g.db.cursor()
+        cursor = get_db().cursor()
         
         # Get current loaner status
         cursor.execute("""
@@ -107,8 +152,7 @@ def toggle_loaner_status(asset_tag):
         """, new_status, inventory_id)
         
         # Log the change
-        log_change(
-            cursor=cursor,
+        audit.record(
             asset_tag=asset_tag,
             action_type='UPDATE',
             field_name='is_loaner',
@@ -117,7 +161,11 @@ def toggle_loaner_status(asset_tag):
             changed_by=request.headers.get('X-User-ID', 'system')
         )
         
-        g.db.commit()
+        publish('hardware.loaner_flag', inventory_id=inventory_id, asset_tag=asset_tag, is_loaner=new_status)
+        
+        audit.commit()
+        invalidate('hardware', 'loaners', 'audit')
+        inventory_index.update_fields(inventory_id, {'is_loaner': new_status})
         
         return jsonify({
             'success': True,
@@ -125,83 +173,158 @@ def toggle_loaner_status(asset_tag):
         })
         
     except Exception as e:
-        g.db.rollback()
+        rollback_db()
+        return jsonify({'error': str(e)}), 500
+
+MAX_BULK_LOANER_FLAGS = 1000
+
+@app.route('/api/hardware/loaner-flags', methods=['POST'])
+def set_loaner_flags():
+    """Set is_loaner on many assets in one transaction.
+
+    Takes {"asset_tags": [...], "is_loaner": true|false} and reports each
+    tag as updated, unchanged or not_found. Only changed rows are written
+    and audited, with all audit rows in one INSERT.
+    """
+    data = request.get_json(silent=True) or {}
+    asset_tags = data.get('asset_tags')
+    is_loaner = data.get('is_loaner')
+    if not isinstance(asset_tags, list) or not asset_tags:
+        return jsonify({'error': 'asset_tags must be a non-empty list'}), 400
+    if len(asset_tags) > MAX_BULK_LOANER_FLAGS:
+        return jsonify({'error': f'At most {MAX_BULK_LOANER_FLAGS} asset_tags per request'}), 400
+    if not all(isinstance(tag, str) and tag.strip() for tag in asset_tags):
+        return jsonify({'error': 'asset_tags must be non-empty strings'}), 400
+    if not isinstance(is_loaner, bool):
+        return jsonify({'error': 'is_loaner must be true or false'}), 400
+    
+    asset_tags = list(dict.fromkeys(tag.strip() for tag in asset_tags))
+    try:
+        cursor = get_db().cursor()
+        
+        # One set-based UPDATE for every tag that needs changing; OUTPUT
+        # returns the rows it touched (a tag can match several items)
+        cursor.execute("""
+            UPDATE i
+            SET is_loaner = ?
+            OUTPUT inserted.inventory_id, inserted.asset_tag, deleted.is_loaner
+            FROM dbo.Formatted_Company_Inventory i
+            JOIN OPENJSON(?) WITH (asset_tag NVARCHAR(4000) '$') t ON i.asset_tag = t.asset_tag
+            WHERE i.is_loaner <> ?
+        """, is_loaner, json.dumps(asset_tags), is_loaner)
+        changed = cursor.fetchall()
+        
+        # Tags that exist but were already in the requested state
+        cursor.execute("""
+            SELECT DISTINCT i.asset_tag
+            FROM dbo.Formatted_Company_Inventory i
+            JOIN OPENJSON(?) WITH (asset_tag NVARCHAR(4000) '$') t ON i.asset_tag = t.asset_tag
+        """, json.dumps(asset_tags))
+        found = {row[0] for row in cursor.fetchall()}
+        
+        changed_by = request.headers.get('X-User-ID', 'system')
+        for inventory_id, asset_tag, old_status in changed:
+            audit.record(asset_tag, 'UPDATE', 'is_loaner', str(old_status), str(is_loaner), changed_by)
+            publish('hardware.loaner_flag', inventory_id=inventory_id, asset_tag=asset_tag, is_loaner=is_loaner)
+        
+        audit.commit()
+        if changed:
+            invalidate('hardware', 'loaners', 'audit')
+            for inventory_id, _, _ in changed:
+                inventory_index.update_fields(inventory_id, {'is_loaner': is_loaner})
+        
+        updated = {}
+        for _, asset_tag, _ in changed:
+            updated[asset_tag] = updated.get(asset_tag, 0) + 1
+        results = []
+        for asset_tag in asset_tags:
+            if asset_tag in updated:
+                results.append({'asset_tag': asset_tag, 'status': 'updated', 'items': updated[asset_tag]})
+            elif asset_tag in found:
+                results.append({'asset_tag': asset_tag, 'status': 'unchanged'})
+            else:
+                results.append({'asset_tag': asset_tag, 'status': 'not_found'})
+        
+        return jsonify({
+            'success': True,
+            'is_loaner': is_loaner,
+            'updated': len(updated),
+            'results': results
+        })
+        
+    except Exception as e:
+        rollback_db()
         return jsonify({'error': str(e)}), 500
 
+DEFAULT_PER_PAGE = 25
+MAX_PER_PAGE = 200
+
+UNFILTERED = " WHERE 1=1"
+
 @app.route('/api/hardware', methods=['GET'])
+@conditional('hardware', 'locations')
 def get_hardware():
+    """List hardware, either by page number or by seeking from a cursor.
+
+    Passing `cursor` (empty for the first page) switches to keyset mode,
+    which returns a `next_cursor` token instead of page counts and costs
+    the same no matter how deep into the inventory the page is. `fields`
+    narrows the columns selected and returned, and `per_page` sets the
+    page size (1 to MAX_PER_PAGE). Any of HARDWARE_FILTERS may be combined,
+    and `sort` orders by HARDWARE_SORTABLE columns ("-" for descending).
+    """
     try:
-        cursor = g.db.cursor()
+        cursor = get_db().cursor()
         
         # Get query parameters
-        room_type = request.args.get('room_type')
-        page = int(request.args.get('page', 1))
-        per_page = 25  # Fixed page size
-        offset = (page - 1) * per_page
+        page_cursor = request.args.get('cursor')
+        try:
+            fields = _parse_fields(request.args.get('fields'))
+            per_page = _parse_per_page(request.args.get('per_page'))
+            where, where_params = _hardware_filters(request.args)
+            sort_keys, sort_tag = _hardware_sort(request.args.get('sort'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # First get total count
-        count_query = """
-            SELECT COUNT(*)
-            FROM dbo.Formatted_Company_Inventory i
-            JOIN dbo.Locations l ON i.location_id = l.location_id
-            WHERE 1=1
-        """
-        count_params = []
-        
-        if room_type:
-            count_query += " AND l.room_type = ?"
-            count_params.append(room_type)
-            
-        cursor.execute(count_query, count_params)
-        total_items = cursor.fetchone()[0]
+        # Keyset mode needs the sort columns to build the next cursor, even if not requested
+        selected = list(fields)
+        if page_cursor is not None:
+            selected += [key.column for key in sort_keys if key.column not in fields]
         
         # Base query for data
-        query = """
-            SELECT 
-                i.inventory_id,
-                l.site_name,
-                l.room_number,
-                l.room_name,
-                l.room_type,
-                i.asset_tag,
-                i.asset_type,
-                i.model,
-                i.serial_number,
-                i.notes,
-                i.assigned_to,
-                i.date_assigned,
-                i.date_decommissioned,
-                i.is_loaner
+        query = f"""
+            SELECT {', '.join(HARDWARE_FIELDS[field] for field in selected)}
             FROM dbo.Formatted_Company_Inventory i
             JOIN dbo.Locations l ON i.location_id = l.location_id
-            WHERE 1=1
         """
-        params = []
         
-        # Add room type filter if specified
-        if room_type:
-            query += " AND l.room_type = ?"
-            params.append(room_type)
-            
+        if page_cursor is not None:
+            return _get_hardware_page_after(
+                cursor, query, where, where_params, sort_keys, sort_tag, page_cursor, per_page, fields)
+        
+        page = int(request.args.get('page', 1))
+        offset = (page - 1) * per_page
+        
+        # Unfiltered requests may ask for the row-count estimate instead of an exact count
+        estimate = request.args.get('estimate') == '1' and where == UNFILTERED
+        total_items = _count_hardware(cursor, where, where_params, estimate)
+        
         # Add ORDER BY, OFFSET and FETCH NEXT
-        query += """ 
-            ORDER BY l.site_name, l.room_number, i.asset_tag
+        query += where + f""" 
+            ORDER BY {order_by(sort_keys)}
             OFFSET ? ROWS
             FETCH NEXT ? ROWS ONLY
         """
-        params.extend([offset, per_page])
+        params = where_params + [offset, per_page]
         
         cursor.execute(query, params)
         
-        columns = [column[0] for column in cursor.description]
-        items = []
-        
-        for row in cursor.fetchall():
-            items.append(dict(zip(columns, row)))
+        items = encode_rows(columns_of(cursor), cursor.fetchall())
             
-        return jsonify({
-            'items': items,
+        return json_response({
+            'items': RawJSON(items),
             'total_items': total_items,
+            'total_is_estimate': estimate,
             'page': page,
             'per_page': per_page,
             'total_pages': (total_items + per_page - 1) // per_page
@@ -210,12 +333,365 @@ def get_hardware():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/hardware/export', methods=['GET'])
+@conditional('hardware', 'locations')
+def export_hardware():
+    """Stream the whole (filtered) inventory as NDJSON or CSV"""
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unsupported export format: {export_format}'}), 400
+    try:
+        fields = _parse_fields(request.args.get('fields'))
+        where, where_params = _hardware_filters(request.args)
+        sort_keys, _ = _hardware_sort(request.args.get('sort'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        cursor = get_db().cursor()
+        cursor.execute(f"""
+            SELECT {', '.join(HARDWARE_FIELDS[field] for field in fields)}
+            FROM dbo.Formatted_Company_Inventory i
+            JOIN dbo.Locations l ON i.location_id = l.location_id
+        """ + where + f"""
+            ORDER BY {order_by(sort_keys)}
+        """, where_params)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    # stream_with_context keeps the request, and with it the pooled connection,
+    # alive until the last batch has been sent
+    filename = f"inventory-{datetime.now().strftime('%Y%m%d')}.{export_format}"
+    return Response(
+        stream_with_context(iter_export(cursor, export_format)),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+# Columns /api/hardware/facets counts values of, as facet name -> SQL expression
+HARDWARE_FACETS = {
+    'room_type': 'l.room_type',
+    'site_name': 'l.site_name',
+    'asset_type': 'i.asset_type',
+    'is_loaner': 'i.is_loaner',
+}
+
+@app.route('/api/hardware/facets', methods=['GET'])
+@conditional('hardware', 'locations')
+def get_hardware_facets():
+    """Value counts for every facet under the active filters, from one GROUPING SETS query"""
+    try:
+        where, where_params = _hardware_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        key = (where, tuple(where_params))
+        result = hardware_facets.get(key)
+        if result is None:
+            result = _count_facets(get_db().cursor(), where, where_params)
+            hardware_facets.set(key, result)
+            hardware_counts.set(key, result['total_items'])
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _count_facets(cursor, where, where_params):
+    exprs = list(HARDWARE_FACETS.values())
+    # One grouping set per facet plus () for the overall total; GROUPING()
+    # tells which set a row belongs to, since a value can itself be NULL
+    cursor.execute(f"""
+        SELECT
+            {', '.join(exprs)},
+            {', '.join(f'GROUPING({expr})' for expr in exprs)},
+            COUNT(*)
+        FROM dbo.Formatted_Company_Inventory i
+        JOIN dbo.Locations l ON i.location_id = l.location_id
+    """ + where + f"""
+        GROUP BY GROUPING SETS ({', '.join(f'({expr})' for expr in exprs)}, ())
+    """, where_params)
+    
+    facets = {name: [] for name in HARDWARE_FACETS}
+    total_items = 0
+    names = list(HARDWARE_FACETS)
+    for row in cursor.fetchall():
+        values = row[:len(names)]
+        grouped = row[len(names):-1]
+        count = row[-1]
+        if all(grouped):
+            total_items = count
+            continue
+        index = list(grouped).index(0)
+        facets[names[index]].append({'value': values[index], 'count': count})
+    
+    for values in facets.values():
+        values.sort(key=lambda facet: (-facet['count'], str(facet['value'])))
+    return {'facets': facets, 'total_items': total_items}
+
+@app.route('/api/hardware/search', methods=['GET'])
+def search_hardware():
+    """Ranked full-text search over the in-memory inventory index"""
+    query = request.args.get('q', '').strip()
+    try:
+        limit = _parse_per_page(request.args.get('limit'), 'limit')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not query:
+        return jsonify({'error': 'Missing search query: q'}), 400
+    
+    try:
+        started = time.perf_counter()
+        total_matches, results = get_search_index().search(query, limit)
+        items = []
+        for score, doc in results:
+            item = {field: doc.get(field) for field in HARDWARE_FIELDS}
+            item['score'] = score
+            items.append(item)
+        
+        return json_response({
+            'items': items,
+            'total_matches': total_matches,
+            'took_ms': round((time.perf_counter() - started) * 1000, 2)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/suggest/<field>', methods=['GET'])
+def suggest_values(field):
+    """Most frequent values of a form field starting with `prefix`, from the in-memory tries"""
+    if field not in suggest.FIELD_QUERIES:
+        return jsonify({'error': f'Unknown field: {field}'}), 404
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    limit = max(1, min(limit, 50))
+    
+    try:
+        return jsonify([
+            {'value': value, 'count': count}
+            for value, count in suggest.suggest(field, request.args.get('prefix', ''), limit)
+        ])
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _hardware_filters(args):
+    """Compile the HARDWARE_FILTERS in `args` into the WHERE clause shared by the
+    hardware list, count and export queries. Raises ValueError for a malformed value.
+    """
+    where = UNFILTERED
+    where_params = []
+    
+    for name, (kind, sql) in HARDWARE_FILTERS.items():
+        values = [value.strip() for value in args.getlist(name) if value.strip()]
+        if not values:
+            continue
+        if kind == 'text':
+            if len(values) == 1:
+                where += f" AND {sql} = ?"
+            else:
+                where += f" AND {sql} IN ({', '.join('?' for _ in values)})"
+            where_params.extend(values)
+        elif kind == 'flag':
+            where += f" AND {sql[_parse_flag(name, values[-1])]}"
+        elif kind == 'from':
+            where += f" AND {sql} >= ?"
+            where_params.append(_parse_date(name, values[-1]))
+        else:
+            # Dates may carry a time of day, so the bound is the start of the next day
+            where += f" AND {sql} < ?"
+            where_params.append(_parse_date(name, values[-1]) + timedelta(days=1))
+    
+    return where, where_params
+
+def _hardware_sort(raw):
+    """Sort keys and cursor tag for a `sort` parameter; the default order has tag ''"""
+    if not raw:
+        return HARDWARE_SORT_KEYS, ''
+    return parse_sort(raw, HARDWARE_SORTABLE, HARDWARE_SORT_KEYS[-1])
+
+def _parse_flag(name, raw):
+    value = raw.lower()
+    if value in ('1', 'true', 'yes'):
+        return True
+    if value in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f'{name} must be true or false')
+
+def _parse_date(name, raw):
+    try:
+        return date.fromisoformat(raw)
+    except ValueError:
+        raise ValueError(f'{name} must be a date (YYYY-MM-DD)')
+
+def _parse_fields(raw):
+    """Validate a comma-separated `fields` parameter against HARDWARE_FIELDS"""
+    if not raw:
+        return list(HARDWARE_FIELDS)
+    fields = []
+    for field in raw.split(','):
+        field = field.strip()
+        if field not in HARDWARE_FIELDS:
+            raise ValueError(f'Unknown field: {field}')
+        if field not in fields:
+            fields.append(field)
+    return fields
+
+def _parse_per_page(raw, name='per_page'):
+    if raw is None:
+        return DEFAULT_PER_PAGE
+    try:
+        per_page = int(raw)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+    if not 1 <= per_page <= MAX_PER_PAGE:
+        raise ValueError(f'{name} must be between 1 and {MAX_PER_PAGE}')
+    return per_page
+
+def _count_hardware(cursor, where, where_params, estimate=False):
+    """Total rows matching a hardware filter, served from the count cache when possible"""
+    key = ('estimate',) if estimate else (where, tuple(where_params))
+    total_items = hardware_counts.get(key)
+    if total_items is not None:
+        return total_items
+    
+    if estimate:
+        # Row count from partition metadata: no scan, but it counts inventory
+        # rows that have no location as well.
+        cursor.execute("""
+            SELECT SUM(p.rows)
+            FROM sys.partitions p
+            WHERE p.object_id = OBJECT_ID('dbo.Formatted_Company_Inventory')
+            AND p.index_id IN (0, 1)
+        """)
+    else:
+        cursor.execute("""
+            SELECT COUNT(*)
+            FROM dbo.Formatted_Company_Inventory i
+            JOIN dbo.Locations l ON i.location_id = l.location_id
+        """ + where, where_params)
+    total_items = cursor.fetchone()[0] or 0
+    
+    hardware_counts.set(key, total_items)
+    return total_items
+
+def _get_hardware_page_after(cursor, query, where, where_params, sort_keys, sort_tag, page_cursor, per_page, fields):
+    """Keyset mode of get_hardware: seek past the cursor instead of using OFFSET"""
+    params = list(where_params)
+    if page_cursor:
+        try:
+            # The tag ties a cursor to the sort it was issued for
+            last_values = decode_cursor(page_cursor, sort_tag)
+            seek_sql, seek_params = seek_predicate(sort_keys, last_values)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        where += " AND " + seek_sql
+        params.extend(seek_params)
+    
+    # Fetch one extra row to learn whether another page follows
+    query += where + f"""
+        ORDER BY {order_by(sort_keys)}
+        OFFSET 0 ROWS
+        FETCH NEXT ? ROWS ONLY
+    """
+    params.append(per_page + 1)
+    cursor.execute(query, params)
+    
+    columns = columns_of(cursor)
+    rows = cursor.fetchall()
+    
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor([last[columns.index(key.column)] for key in sort_keys], sort_tag)
+    
+    # Sort columns selected only for the cursor are left out of the payload
+    return json_response({
+        'items': RawJSON(encode_rows(columns, rows, fields)),
+        'per_page': per_page,
+        'next_cursor': next_cursor
+    })
+
+# Newest first; audit_id breaks ties between events logged in the same instant.
+# Served by IX_AuditLog_AssetTag_ChangedAt (create_audit_log_index.sql). Hot
+# rows are selected in AUDIT_COLUMNS order so they merge with archived rows.
+AUDIT_SORT_KEYS = [
+    SortKey('changed_at', 'changed_at', True, False, 'CAST(? AS DATETIME)'),
+    SortKey('audit_id', 'audit_id', True, False),
+]
+AUDIT_PAGE_PARAMS = ('from', 'to', 'action_type', 'limit', 'cursor')
+DEFAULT_AUDIT_LIMIT = 50
+MAX_AUDIT_LIMIT = 500
+
 @app.route('/api/hardware/<asset_tag>/audit', methods=['GET'])
+@conditional('audit')
 def get_audit_log(asset_tag):
+    """Audit history for one asset, newest first.
+
+    With none of AUDIT_PAGE_PARAMS this returns the whole history as a bare
+    array, as it always has. Otherwise it returns one page,
+    {'items', 'limit', 'next_cursor'}: `from`/`to` (YYYY-MM-DD, inclusive)
+    bound changed_at, `action_type` may be repeated, `limit` is the page
+    size (1 to MAX_AUDIT_LIMIT) and `cursor` is the next_cursor of the
+    previous page. Rows moved to the archive tier (audit_archive.py) are
+    merged in, so callers cannot tell which tier a row came from.
+    """
+    if not any(param in request.args for param in AUDIT_PAGE_PARAMS):
+        try:
+            cursor = get_db().cursor()
+            cursor.execute("""
+                SELECT 
+                    audit_id,
+                    changed_at,
+                    action_type,
+                    field_name,
+                    old_value,
+                    new_value,
+                    changed_by
+                FROM dbo.AuditLog
+                WHERE asset_tag = ?
+                ORDER BY changed_at DESC, audit_id DESC
+            """, asset_tag)
+            rows = _merge_archived(cursor.fetchall(), audit_archive.history(asset_tag))
+            
+            return json_response(RawJSON(encode_rows(AUDIT_COLUMNS, rows, AUDIT_COLUMNS[1:])))
+            
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
     try:
-        cursor = g.db.cursor()
-        cursor.execute("""
-            SELECT 
+        start, end, action_types, limit = _audit_filters(request.args)
+        page_cursor = request.args.get('cursor')
+        before = _decode_audit_cursor(page_cursor) if page_cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    where = "asset_tag = ?"
+    params = [asset_tag]
+    if start is not None:
+        where += " AND changed_at >= ?"
+        params.append(start)
+    if end is not None:
+        where += " AND changed_at < ?"
+        params.append(end)
+    if action_types:
+        where += f" AND action_type IN ({', '.join('?' * len(action_types))})"
+        params.extend(action_types)
+    if before is not None:
+        seek_sql, seek_params = seek_predicate(AUDIT_SORT_KEYS, list(before))
+        where += " AND " + seek_sql
+        params.extend(seek_params)
+    
+    try:
+        cursor = get_db().cursor()
+        # Fetch one extra row to learn whether another page follows
+        cursor.execute(f"""
+            SELECT TOP (?)
+                audit_id,
                 changed_at,
                 action_type,
                 field_name,
@@ -223,20 +699,71 @@ def get_audit_log(asset_tag):
                 new_value,
                 changed_by
             FROM dbo.AuditLog
-            WHERE asset_tag = ?
-            ORDER BY changed_at DESC
-        """, asset_tag)
+            WHERE {where}
+            ORDER BY {order_by(AUDIT_SORT_KEYS)}
+        """, [limit + 1] + params)
+        hot = cursor.fetchall()
+        archived = audit_archive.history(asset_tag, start, end, action_types, before, limit + 1)
+        rows = _merge_archived(hot, archived)[:limit + 1]
         
-        columns = [column[0] for column in cursor.description]
-        results = []
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([rows[-1][1], rows[-1][0]], 'audit')
         
-        for row in cursor.fetchall():
-            results.append(dict(zip(columns, row)))
-            
-        return jsonify(results)
+        return json_response({
+            'items': RawJSON(encode_rows(AUDIT_COLUMNS, rows)),
+            'limit': limit,
+            'next_cursor': next_cursor
+        })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _merge_archived(hot, archived):
+    """Hot and archived audit rows as one newest-first list.
+
+    A row can be in both while the archiver is between writing a segment
+    and deleting the rows from SQL; the SQL copy is kept.
+    """
+    if not archived:
+        return hot
+    seen = {row[0] for row in hot}
+    rows = list(hot) + [row for row in archived if row[0] not in seen]
+    rows.sort(key=lambda row: (row[1], row[0]), reverse=True)
+    return rows
+
+def _decode_audit_cursor(token):
+    """(changed_at, audit_id) from an audit next_cursor; raises ValueError"""
+    values = decode_cursor(token, 'audit')
+    try:
+        changed_at, audit_id = values
+        # Compare as a datetime: the ISO string would not convert to DATETIME
+        return (datetime.fromisoformat(changed_at), int(audit_id))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+def _audit_filters(args):
+    """(start, end, action_types, limit) for a paged audit request; raises ValueError.
+
+    start and end are datetimes bounding changed_at as start <= changed_at < end.
+    """
+    start = end = None
+    if args.get('from'):
+        start = datetime.combine(_parse_date('from', args['from']), datetime.min.time())
+    if args.get('to'):
+        end = datetime.combine(_parse_date('to', args['to']) + timedelta(days=1), datetime.min.time())
+    action_types = [value for value in args.getlist('action_type') if value]
+    
+    limit = DEFAULT_AUDIT_LIMIT
+    if args.get('limit'):
+        try:
+            limit = int(args['limit'])
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        if not 1 <= limit <= MAX_AUDIT_LIMIT:
+            raise ValueError(f'limit must be between 1 and {MAX_AUDIT_LIMIT}')
+    return start, end, action_types, limit
+
 if __name__ == '__main__':
     app.run(debug=True)
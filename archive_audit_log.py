@@ -0,0 +1,43 @@
+"""Move old dbo.AuditLog rows into the compressed archive (audit_archive.py).
+
+Rows with changed_at older than AUDIT_ARCHIVE_DAYS (or --days) are written
+to segment files under AUDIT_ARCHIVE_PATH (required, on persistent storage
+outside the app folder) and then deleted from SQL. The
+audit log API keeps returning them from the archive. Meant to run on a
+schedule, e.g. nightly; only one run can hold the archive lock at a time.
+
+    python archive_audit_log.py [--days N]
+"""
+import argparse
+import os
+from datetime import datetime, timedelta, timezone
+
+import pyodbc
+
+import config
+from audit_archive import archive
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=config.AUDIT_ARCHIVE_DAYS,
+                        help='archive rows older than this many days')
+    args = parser.parse_args()
+    if args.days < 1:
+        parser.error('--days must be at least 1')
+    if not config.AUDIT_ARCHIVE_PATH:
+        # Rows are deleted from SQL once archived, so they must land somewhere
+        # that survives redeploys: never a default inside the app folder
+        parser.error('AUDIT_ARCHIVE_PATH must be set to a directory on persistent storage')
+    
+    # changed_at is stored in UTC
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=args.days)
+    conn = pyodbc.connect(os.getenv('DATABASE_URL'))
+    try:
+        moved = archive(conn, cutoff, config.AUDIT_ARCHIVE_PATH, config.AUDIT_ARCHIVE_BATCH)
+    finally:
+        conn.close()
+    print(f"Archived {moved} audit rows older than {cutoff.isoformat()} to {config.AUDIT_ARCHIVE_PATH}")
+
+if __name__ == '__main__':
+    main()
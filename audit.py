@@ -0,0 +1,280 @@
+"""Batched audit log writer.
+
+Mutating routes call record() for each audit event and then commit() in
+place of get_db().commit(). Events are collected on flask.g, so however
+many fields a request changes, its audit rows cost one write:
+
+- AUDIT_MODE 'sync' (default): one multi-row INSERT into dbo.AuditLog just
+  before the request's transaction commits, so the rows commit (or roll
+  back) together with the change they describe.
+- AUDIT_MODE 'spool': after the transaction commits, the events are
+  appended to the process's file in AUDIT_SPOOL_DIR and fsynced before the
+  request returns. A background thread drains the spool into dbo.AuditLog
+  in batches of AUDIT_SPOOL_BATCH. Delivery is at-least-once: a crash
+  between a batch's INSERT and the saved drain offset replays that batch.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import g
+
+import config
+import events
+from db_pool import get_db, get_pool
+from utils import log_changes
+
+# One drainer per spool directory, across the processes that share it
+SPOOL_LOCK_SQL = """
+    DECLARE @result INT;
+    EXEC @result = sp_getapplock @Resource = ?, @LockMode = 'Exclusive',
+                                 @LockOwner = 'Session', @LockTimeout = 0;
+    SELECT @result;
+"""
+SPOOL_UNLOCK_SQL = "EXEC sp_releaseapplock @Resource = ?, @LockOwner = 'Session'"
+
+
+def record(asset_tag, action_type, field_name, old_value, new_value, changed_by):
+    """Queue one audit event for this request (same arguments as utils.log_change)"""
+    events = g.setdefault('audit_events', [])
+    events.append({
+        'asset_tag': asset_tag,
+        'action_type': action_type,
+        'field_name': field_name,
+        'old_value': old_value,
+        'new_value': new_value,
+        'changed_by': changed_by,
+        # Azure SQL's GETDATE() is UTC; a spooled event keeps the time it happened
+        'changed_at': datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+            if config.AUDIT_MODE == 'spool' else None
+    })
+
+
+def commit():
+    """Commit the request's transaction together with its queued audit and change events"""
+    audit_events = g.pop('audit_events', [])
+    db = get_db()
+    events.flush(db.cursor())
+    if config.AUDIT_MODE != 'spool':
+        log_changes(db.cursor(), audit_events)
+        db.commit()
+        return
+    db.commit()
+    if audit_events:
+        get_spool().append(audit_events)
+
+
+class AuditSpool:
+    """Local files of audit events, drained into SQL by a background thread.
+
+    Every process appends to a file of its own in `directory`, named for
+    the process and its start time, so no two processes ever write the same
+    file. Each drain pass the owner closes its file and renames it to
+    .ready; then whichever process holds the spool's applock inserts every
+    .ready file, batch by batch, recording its progress in <file>.offset so
+    that the next holder resumes where a crashed one stopped. A .spool file
+    left untouched for AUDIT_SPOOL_ORPHAN_SECONDS belongs to a process that
+    died before rotating it, and is adopted the same way.
+    """
+
+    def __init__(self, directory, batch_size=500, interval=1.0, orphan_seconds=300):
+        self.directory = directory
+        self.path = os.path.join(directory, f'{os.getpid()}-{time.time_ns()}.spool')
+        self.batch_size = batch_size
+        self.interval = interval
+        self.orphan_seconds = orphan_seconds
+        self.lock_resource = f'audit_spool:{socket.gethostname()}:{os.path.abspath(directory)}'[:255]
+        self._file = None
+        self._lock = threading.Lock()  # guards appends and the rotation of this process's file
+        self._wake = threading.Event()
+        self._thread = None
+        self.appended = 0
+        self.drained = 0
+        self.failures = 0
+
+    def append(self, events):
+        """Write events to the spool and fsync before returning"""
+        data = ''.join(json.dumps(event, default=str) + '\n' for event in events).encode('utf-8')
+        with self._lock:
+            if self._file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._file = open(self.path, 'ab')
+                _drop_torn_tail(self._file)
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.appended += len(events)
+        self.start()
+        self._wake.set()
+
+    def start(self):
+        """Start the drain thread if it is not running"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='audit-spool-drain', daemon=True)
+                self._thread.start()
+
+    def stats(self):
+        with self._lock:
+            return {'appended': self.appended, 'drained': self.drained, 'failures': self.failures}
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                while self.drain_once():
+                    pass
+            except Exception as e:
+                self.failures += 1
+                print(f"Audit spool drain failed: {str(e)}")
+
+    def drain_once(self):
+        """Insert the spool's .ready files into dbo.AuditLog; returns False when there was nothing to do"""
+        self._rotate()
+        if not os.path.isdir(self.directory):
+            return False
+        conn = get_pool().acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(SPOOL_LOCK_SQL, self.lock_resource)
+            if cursor.fetchone()[0] < 0:
+                return False  # another process is draining this directory
+            try:
+                self._adopt_orphans()
+                ready = sorted(name for name in os.listdir(self.directory) if name.endswith('.ready'))
+                for name in ready:
+                    self._drain_file(conn, os.path.join(self.directory, name))
+                return bool(ready)
+            finally:
+                cursor.execute(SPOOL_UNLOCK_SQL, self.lock_resource)
+                conn.commit()
+        finally:
+            conn.close()
+
+    def _rotate(self):
+        # Only the owner renames its open file, which Windows would refuse anyone else
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._file = None
+            if os.path.getsize(self.path) == 0:
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self._ready_path())
+
+    def _adopt_orphans(self):
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith('.spool') or path == self.path:
+                continue
+            try:
+                if now - os.path.getmtime(path) < self.orphan_seconds:
+                    continue
+                os.replace(path, self._ready_path())
+            except OSError:
+                continue  # gone already, or still open in a live process
+
+    def _ready_path(self):
+        # Named by rotation time so .ready files drain roughly in the order written
+        return os.path.join(self.directory, f'{time.time_ns():020d}-{os.getpid()}.ready')
+
+    def _drain_file(self, conn, path):
+        offset_path = path + '.offset'
+        with open(path, 'rb') as spool:
+            spool.seek(_read_offset(offset_path))
+            while True:
+                events = []
+                for _ in range(self.batch_size):
+                    line = spool.readline()
+                    if not line.endswith(b'\n'):
+                        break  # end of file, or the last write of a process that crashed mid-append
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError:
+                        print(f"Skipping unreadable audit spool line in {path}: {line[:200]!r}")
+                if not events:
+                    break
+                log_changes(conn.cursor(), events)
+                conn.commit()
+                _write_offset(offset_path, spool.tell())
+                with self._lock:
+                    self.drained += len(events)
+
+        os.remove(path)
+        if os.path.exists(offset_path):
+            os.remove(offset_path)
+
+
+def _drop_torn_tail(f):
+    """Cut a partial last record off a spool file opened for appending.
+
+    A crash mid-append leaves the record without its newline; the append
+    never returned, so it was never acknowledged, and appending after it
+    would glue the next acknowledged record onto the torn one.
+    """
+    size = f.seek(0, os.SEEK_END)
+    if size == 0:
+        return
+    with open(f.name, 'rb') as reader:
+        position = size
+        while position > 0:
+            step = min(4096, position)
+            reader.seek(position - step)
+            chunk = reader.read(step)
+            newline = chunk.rfind(b'\n')
+            if newline >= 0:
+                position = position - step + newline + 1
+                break
+            position -= step
+    if position < size:
+        f.truncate(position)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _read_offset(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _write_offset(path, offset):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        f.write(str(offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def get_spool():
+    """Return the process-wide spool, created from config on first use"""
+    global _spool
+    if _spool is None:
+        with _spool_lock:
+            if _spool is None:
+                _spool = AuditSpool(
+                    config.AUDIT_SPOOL_DIR,
+                    batch_size=config.AUDIT_SPOOL_BATCH,
+                    interval=config.AUDIT_SPOOL_INTERVAL,
+                    orphan_seconds=config.AUDIT_SPOOL_ORPHAN_SECONDS
+                )
+    return _spool
+
+
+def stats():
+    if config.AUDIT_MODE != 'spool':
+        return {'mode': config.AUDIT_MODE}
+    return dict(get_spool().stats(), mode='spool')
@@ -0,0 +1,245 @@
+"""Archive tier for the audit log.
+
+archive() moves dbo.AuditLog rows older than AUDIT_ARCHIVE_DAYS into
+compressed segment files under AUDIT_ARCHIVE_PATH, partitioned by month
+of changed_at:
+
+    <root>/<YYYY>/<MM>/<first audit_id>-<last audit_id>-<written at>.seg
+    <root>/<YYYY>/<MM>/<first audit_id>-<last audit_id>-<written at>.idx
+
+A segment holds one zlib-compressed block per asset_tag, each a JSON array
+of that tag's rows, newest first. The .idx file is the segment's asset_tag
+index: for each tag the block's offset, length, row count and newest and
+oldest changed_at, plus the segment's overall time range. It is written
+after the .seg file, so a segment only exists for readers once both are
+on disk. A segment is never rewritten: the write time in its name keeps a
+rerun over the same ids from replacing a file a reader has indexed.
+
+Rows are deleted from SQL only after their segment is durable. A crash in
+between leaves them in both places and a later run archives them again;
+readers drop the duplicates by audit_id.
+
+AuditArchive is the read side used by get_audit_log: it keeps every .idx
+in memory (rescanning for new ones every AUDIT_ARCHIVE_RESCAN seconds) and
+decompresses only the blocks of the requested asset_tag, newest segment
+first, stopping once it has enough rows for the page. With no
+AUDIT_ARCHIVE_PATH nothing can have been archived, and it returns no rows.
+"""
+import json
+import os
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime
+
+import config
+
+# Columns of an archived row, in the order get_audit_log selects them
+ROW_COLUMNS = ('audit_id', 'changed_at', 'action_type', 'field_name', 'old_value', 'new_value', 'changed_by')
+
+# Served by IX_AuditLog_ChangedAt (create_audit_archive_index.sql)
+ARCHIVE_BATCH_QUERY = """
+    SELECT TOP (?) audit_id, asset_tag, changed_at, action_type, field_name, old_value, new_value, changed_by
+    FROM dbo.AuditLog
+    WHERE changed_at < ?
+    ORDER BY changed_at, audit_id
+"""
+
+DELETE_ARCHIVED_SQL = """
+    DELETE a
+    FROM dbo.AuditLog a
+    JOIN OPENJSON(?) WITH (audit_id BIGINT '$') archived ON archived.audit_id = a.audit_id
+"""
+
+# Only one archiver at a time, across processes and servers
+ARCHIVE_LOCK_SQL = """
+    DECLARE @result INT;
+    EXEC @result = sp_getapplock @Resource = 'audit_archive', @LockMode = 'Exclusive',
+                                 @LockOwner = 'Session', @LockTimeout = 0;
+    SELECT @result;
+"""
+ARCHIVE_UNLOCK_SQL = "EXEC sp_releaseapplock @Resource = 'audit_archive', @LockOwner = 'Session'"
+
+
+def archive(conn, cutoff, root, batch_size=5000):
+    """Move audit rows with changed_at < cutoff into segment files; returns the number moved"""
+    cursor = conn.cursor()
+    cursor.execute(ARCHIVE_LOCK_SQL)
+    if cursor.fetchone()[0] < 0:
+        raise RuntimeError('Another audit archiver is running')
+    try:
+        moved = 0
+        while True:
+            cursor.execute(ARCHIVE_BATCH_QUERY, (batch_size, cutoff))
+            rows = cursor.fetchall()
+            if not rows:
+                return moved
+            by_month = defaultdict(list)
+            for row in rows:
+                by_month[(row[2].year, row[2].month)].append(row)
+            for (year, month), month_rows in sorted(by_month.items()):
+                write_segment(os.path.join(root, f'{year:04d}', f'{month:02d}'), month_rows)
+            cursor.execute(DELETE_ARCHIVED_SQL, json.dumps([row[0] for row in rows]))
+            conn.commit()
+            moved += len(rows)
+    finally:
+        cursor.execute(ARCHIVE_UNLOCK_SQL)
+        conn.commit()
+
+
+def write_segment(directory, rows):
+    """Write (audit_id, asset_tag, changed_at, ...) rows as one segment and its index"""
+    os.makedirs(directory, exist_ok=True)
+    by_tag = defaultdict(list)
+    for audit_id, asset_tag, changed_at, *values in rows:
+        by_tag[asset_tag].append([audit_id, changed_at.isoformat(), *values])
+
+    first_id = min(row[0] for row in rows)
+    last_id = max(row[0] for row in rows)
+    name = os.path.join(directory, f'{first_id}-{last_id}-{time.time_ns()}')
+    index = {
+        'rows': len(rows),
+        'newest': max(row[2] for row in rows).isoformat(),
+        'oldest': min(row[2] for row in rows).isoformat(),
+        'tags': {}
+    }
+    offset = 0
+    with open(name + '.seg.tmp', 'xb') as segment:
+        for asset_tag, tag_rows in sorted(by_tag.items()):
+            tag_rows.sort(key=lambda row: (row[1], row[0]), reverse=True)
+            block = zlib.compress(
+                json.dumps(tag_rows, default=str, separators=(',', ':')).encode('utf-8'), 9)
+            segment.write(block)
+            # [offset, length, rows, newest, oldest]
+            index['tags'][asset_tag] = [offset, len(block), len(tag_rows), tag_rows[0][1], tag_rows[-1][1]]
+            offset += len(block)
+        segment.flush()
+        os.fsync(segment.fileno())
+    os.replace(name + '.seg.tmp', name + '.seg')
+    _write_durably(name + '.idx', json.dumps(index, separators=(',', ':')))
+    return name
+
+
+def _write_durably(path, text):
+    with open(path + '.tmp', 'x', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def _newest_first(rows):
+    return sorted(rows, key=lambda row: (row[1], row[0]), reverse=True)
+
+
+class AuditArchive:
+    def __init__(self, root, rescan_interval=60):
+        self.root = root
+        self.rescan_interval = rescan_interval
+        self._lock = threading.Lock()
+        self._segments = {}   # segment path -> parsed index
+        self._by_tag = {}     # asset_tag -> [(newest, oldest, segment path, offset, length)], newest first
+        self._scanned_at = None
+        self.blocks_read = 0
+
+    def history(self, asset_tag, start=None, end=None, action_types=None, before=None, limit=None):
+        """Archived rows of one asset, newest first, as ROW_COLUMNS tuples.
+
+        start/end bound changed_at (start <= changed_at < end), before is a
+        (changed_at, audit_id) seek position, and limit stops reading once
+        that many rows are certain to be the newest matches.
+        """
+        found = {}
+        ranked = []
+        for newest, oldest, path, offset, length in self._blocks(asset_tag):
+            if start is not None and newest < start:
+                break  # every later block is older still
+            if (end is not None and oldest >= end) or (before is not None and oldest > before[0]):
+                continue
+            if limit is not None and len(ranked) >= limit and newest < ranked[limit - 1][1]:
+                break
+            for row in self._read_block(path, offset, length):
+                if row[0] in found:
+                    continue
+                changed_at = row[1]
+                if start is not None and changed_at < start:
+                    continue
+                if end is not None and changed_at >= end:
+                    continue
+                if before is not None and (changed_at, row[0]) >= before:
+                    continue
+                if action_types and row[2] not in action_types:
+                    continue
+                found[row[0]] = row
+            if limit is not None:
+                ranked = _newest_first(found.values())
+        if limit is None:
+            return _newest_first(found.values())
+        return ranked[:limit]
+
+    def stats(self):
+        self._scan_if_due()
+        with self._lock:
+            return {
+                'segments': len(self._segments),
+                'rows': sum(index['rows'] for index in self._segments.values()),
+                'blocks_read': self.blocks_read
+            }
+
+    def rescan(self):
+        """Pick up segments written since the last scan"""
+        if not self.root:
+            with self._lock:
+                self._scanned_at = time.monotonic()
+            return
+        segments = dict(self._segments)
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith('.idx'):
+                    continue
+                path = os.path.join(directory, name[:-len('.idx')])
+                if path in segments:
+                    continue
+                try:
+                    with open(path + '.idx', encoding='utf-8') as f:
+                        segments[path] = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Skipping unreadable audit archive index {path}.idx: {str(e)}")
+
+        by_tag = defaultdict(list)
+        for path, index in segments.items():
+            for asset_tag, (offset, length, _, newest, oldest) in index['tags'].items():
+                by_tag[asset_tag].append((
+                    datetime.fromisoformat(newest), datetime.fromisoformat(oldest), path, offset, length))
+        for blocks in by_tag.values():
+            blocks.sort(reverse=True)
+        with self._lock:
+            self._segments = segments
+            self._by_tag = dict(by_tag)
+            self._scanned_at = time.monotonic()
+
+    def _blocks(self, asset_tag):
+        self._scan_if_due()
+        with self._lock:
+            return list(self._by_tag.get(asset_tag, ()))
+
+    def _scan_if_due(self):
+        with self._lock:
+            due = self._scanned_at is None or time.monotonic() - self._scanned_at >= self.rescan_interval
+        if due:
+            self.rescan()
+
+    def _read_block(self, path, offset, length):
+        with open(path + '.seg', 'rb') as segment:
+            segment.seek(offset)
+            block = segment.read(length)
+        with self._lock:
+            self.blocks_read += 1
+        return [
+            (audit_id, datetime.fromisoformat(changed_at), *values)
+            for audit_id, changed_at, *values in json.loads(zlib.decompress(block))
+        ]
+
+
+audit_archive = AuditArchive(config.AUDIT_ARCHIVE_PATH, config.AUDIT_ARCHIVE_RESCAN)
@@ -0,0 +1,111 @@
+"""In-memory index of which loaner devices are available.
+
+AvailabilityIndex holds every loaner (is_loaner = 1) inventory row, already
+encoded as JSON, plus the set of inventory_ids with an open checkout, so
+/api/loaners/available is answered without scanning dbo.AvailableLoaners.
+The checkout and checkin routes update it after they commit. It is
+registered with the 'hardware' and 'locations' cache families, so any
+inventory write (e.g. a loaner flag toggle) makes the next read reload it,
+and it also reloads every LOANER_AVAILABILITY_TTL seconds to pick up writes
+made by other processes.
+"""
+import threading
+import time
+
+import config
+from cache import register
+from serializers import columns_of, encode_row, row_layout
+
+LOANERS_QUERY = "SELECT i.* FROM dbo.Formatted_Company_Inventory i WHERE i.is_loaner = 1"
+
+# Served by UX_LoanerCheckouts_Open (create_open_checkout_index.sql)
+OPEN_CHECKOUTS_QUERY = "SELECT inventory_id FROM dbo.LoanerCheckouts WHERE checkin_date IS NULL"
+
+
+class AvailabilityIndex:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._rows = {}           # inventory_id -> row dict
+        self._encoded = {}        # inventory_id -> row as a JSON object
+        self._checked_out = set()
+        self._loaded_at = None
+        self._replay = None       # checkouts/checkins made while a load is reading
+        self._cleared = 0
+
+    def available_json(self, cursor):
+        """JSON array of the available loaner rows, in inventory_id order"""
+        self._ensure_loaded(cursor)
+        with self._lock:
+            available = sorted(set(self._encoded) - self._checked_out)
+            return '[' + ','.join(self._encoded[inventory_id] for inventory_id in available) + ']'
+
+    def row(self, inventory_id):
+        """The indexed inventory row for a loaner, or None"""
+        with self._lock:
+            return self._rows.get(inventory_id)
+
+    def checked_out(self, inventory_id):
+        self._apply(lambda: self._checked_out.add(inventory_id))
+
+    def checked_in(self, inventory_id):
+        self._apply(lambda: self._checked_out.discard(inventory_id))
+
+    def clear(self):
+        with self._lock:
+            self._loaded_at = None
+            self._cleared += 1
+
+    def load(self, cursor):
+        """Replace the index with the current loaners and open checkouts"""
+        with self._lock:
+            cleared = self._cleared
+            self._replay = []
+        try:
+            cursor.execute(LOANERS_QUERY)
+            columns = columns_of(cursor)
+            layout = row_layout(columns, None)
+            rows = {}
+            encoded = {}
+            for row in cursor.fetchall():
+                inventory_id = row[columns.index('inventory_id')]
+                rows[inventory_id] = dict(zip(columns, row))
+                encoded[inventory_id] = encode_row(row, layout)
+            cursor.execute(OPEN_CHECKOUTS_QUERY)
+            checked_out = {row[0] for row in cursor.fetchall()}
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+
+        with self._lock:
+            replay, self._replay = self._replay, None
+            self._rows = rows
+            self._encoded = encoded
+            self._checked_out = checked_out
+            # The load may have read from before these changes committed
+            for change in replay:
+                change()
+            # A clear() during the load means the data read may already be stale
+            self._loaded_at = time.monotonic() if cleared == self._cleared else None
+
+    def _ensure_loaded(self, cursor):
+        if self._is_current():
+            return
+        with self._load_lock:
+            if not self._is_current():
+                self.load(cursor)
+
+    def _is_current(self):
+        with self._lock:
+            return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def _apply(self, change):
+        with self._lock:
+            change()
+            if self._replay is not None:
+                self._replay.append(change)
+
+
+loaner_availability = register(AvailabilityIndex(config.LOANER_AVAILABILITY_TTL), 'hardware', 'locations')
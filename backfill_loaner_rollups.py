@@ -0,0 +1,41 @@
+"""One-time rebuild of the loaner usage rollups from dbo.LoanerCheckouts.
+
+Creates the rollup tables if needed (migration/create_loaner_rollups.sql),
+then replaces their contents in a single transaction. Safe to re-run; the
+checkout and checkin routes keep the tables current afterwards.
+
+    python backfill_loaner_rollups.py
+"""
+import os
+import pyodbc
+
+import rollups
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    conn = pyodbc.connect(os.getenv('DATABASE_URL'))
+    cursor = conn.cursor()
+    
+    with open(os.path.join(script_dir, 'migration', 'create_loaner_rollups.sql')) as f:
+        for batch in f.read().split('\nGO'):
+            if batch.strip():
+                cursor.execute(batch)
+    conn.commit()
+    
+    try:
+        rollups.backfill(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    
+    cursor.execute("SELECT COUNT(*), SUM(checkouts), SUM(returns) FROM dbo.LoanerDailyUsage")
+    rows, checkouts, returns = cursor.fetchone()
+    cursor.execute("SELECT COUNT(*) FROM dbo.LoanerDailyPeak")
+    days = cursor.fetchone()[0]
+    print(f"Rebuilt {rows} device-day rows ({checkouts or 0} checkouts, {returns or 0} returns) and {days} daily peaks")
+
+if __name__ == '__main__':
+    main()
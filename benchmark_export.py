@@ -0,0 +1,96 @@
+"""Measure peak RSS of the streaming export against the number of rows exported.
+
+Usage:
+    python benchmark_export.py [--rows 10000 100000 1000000] [--format ndjson]
+
+Each measurement runs in a fresh subprocess fed by a synthetic cursor that
+produces inventory-shaped rows on demand, so no database is needed. The
+"buffered" column is the fetchall() + dict(zip()) + json path the list
+endpoints use, shown for contrast.
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+from exports import iter_export
+
+COLUMNS = [
+    'inventory_id', 'site_name', 'room_number', 'room_name', 'room_type',
+    'asset_tag', 'asset_type', 'model', 'serial_number', 'notes',
+    'assigned_to', 'date_assigned', 'date_decommissioned', 'is_loaner',
+]
+
+
+class SyntheticCursor:
+    """Just enough of a pyodbc cursor to drive the export generators"""
+
+    def __init__(self, row_count):
+        self.description = [(name,) for name in COLUMNS]
+        self._remaining = row_count
+        self._next_id = 1
+        self._base_date = datetime(2024, 1, 1)
+
+    def _row(self, i):
+        return (
+            i, 'Main Office', f'{i % 400:03d}', f'Room {i % 400}', 'Office',
+            f'MWG{i:07d}', 'Laptop', 'Latitude 5420', f'SN{i:010d}',
+            'Issued with dock and charger', f'User {i % 250}',
+            self._base_date + timedelta(days=i % 365), None, i % 10 == 0,
+        )
+
+    def fetchmany(self, size):
+        count = min(size, self._remaining)
+        rows = [self._row(self._next_id + n) for n in range(count)]
+        self._next_id += count
+        self._remaining -= count
+        return rows
+
+    def fetchall(self):
+        return self.fetchmany(self._remaining)
+
+
+def run_one(mode, row_count, export_format):
+    cursor = SyntheticCursor(row_count)
+    written = 0
+    if mode == 'streaming':
+        for chunk in iter_export(cursor, export_format):
+            written += len(chunk)
+    else:
+        columns = [column[0] for column in cursor.description]
+        items = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        written = len(json.dumps(items, default=str))
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'peak_kb': peak_kb, 'bytes': written}))
+
+
+def measure(mode, row_count, export_format):
+    output = subprocess.check_output([
+        sys.executable, __file__, '--child', mode, str(row_count), export_format
+    ])
+    return json.loads(output)
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        run_one(sys.argv[2], int(sys.argv[3]), sys.argv[4])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--format', default='ndjson', choices=['ndjson', 'csv'])
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} | {'streaming MB':>12} | {'buffered MB':>12} | {'output MB':>10}")
+    print("-" * 54)
+    for row_count in args.rows:
+        streaming = measure('streaming', row_count, args.format)
+        buffered = measure('buffered', row_count, args.format)
+        print(f"{row_count:>10} | {streaming['peak_kb'] / 1024:>12.1f} | "
+              f"{buffered['peak_kb'] / 1024:>12.1f} | {streaming['bytes'] / 1048576:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
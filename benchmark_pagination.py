@@ -0,0 +1,93 @@
+"""Compare deep-page latency of OFFSET paging and keyset (cursor) paging.
+
+Usage:
+    python benchmark_pagination.py [--per-page 25] [--repeat 5] [--pages 1 10 100 1000]
+
+Runs against the database in DATABASE_URL using the same queries as
+/api/hardware. For each page depth it reports the median time of the
+OFFSET query and of the equivalent seek query.
+"""
+import argparse
+import os
+import statistics
+import time
+
+import pyodbc
+
+from pagination import seek_predicate, order_by
+from hardware_query import HARDWARE_SORT_KEYS
+
+BASE_QUERY = """
+    SELECT
+        i.inventory_id, l.site_name, l.room_number, l.room_name, l.room_type,
+        i.asset_tag, i.asset_type, i.model, i.serial_number, i.notes,
+        i.assigned_to, i.date_assigned, i.date_decommissioned, i.is_loaner
+    FROM dbo.Formatted_Company_Inventory i
+    JOIN dbo.Locations l ON i.location_id = l.location_id
+"""
+ORDER = order_by(HARDWARE_SORT_KEYS)
+
+
+def time_query(cursor, sql, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def last_key_before(cursor, offset):
+    """Sort-key values of the row just before `offset`, i.e. the cursor a client would hold"""
+    columns = ', '.join(key.expr for key in HARDWARE_SORT_KEYS)
+    cursor.execute(f"""
+        SELECT {columns}
+        FROM dbo.Formatted_Company_Inventory i
+        JOIN dbo.Locations l ON i.location_id = l.location_id
+        ORDER BY {ORDER}
+        OFFSET ? ROWS FETCH NEXT 1 ROWS ONLY
+    """, [offset - 1])
+    row = cursor.fetchone()
+    return list(row) if row else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--per-page', type=int, default=25)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100, 1000])
+    args = parser.parse_args()
+
+    conn = pyodbc.connect(os.getenv('DATABASE_URL'))
+    cursor = conn.cursor()
+
+    offset_sql = BASE_QUERY + f" ORDER BY {ORDER} OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+
+    print(f"{'page':>8} | {'offset ms':>10} | {'keyset ms':>10}")
+    print("-" * 36)
+    for page in args.pages:
+        offset = (page - 1) * args.per_page
+        offset_ms = time_query(cursor, offset_sql, [offset, args.per_page], args.repeat)
+
+        if offset == 0:
+            seek_sql = offset_sql
+            seek_params = [0, args.per_page]
+        else:
+            last = last_key_before(cursor, offset)
+            if last is None:
+                print(f"{page:>8} | past the end of the inventory")
+                break
+            predicate, predicate_params = seek_predicate(HARDWARE_SORT_KEYS, last)
+            seek_sql = BASE_QUERY + f" WHERE {predicate} ORDER BY {ORDER} OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY"
+            seek_params = predicate_params + [args.per_page]
+        keyset_ms = time_query(cursor, seek_sql, seek_params, args.repeat)
+
+        print(f"{page:>8} | {offset_ms:>10.2f} | {keyset_ms:>10.2f}")
+
+    cursor.close()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
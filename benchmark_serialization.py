@@ -0,0 +1,63 @@
+"""Microbenchmark: dict(zip()) + jsonify versus the serializers module.
+
+Usage:
+    python benchmark_serialization.py [--rows 10000 100000] [--repeat 5]
+
+Encodes synthetic inventory rows both ways inside a Flask app context and
+reports the median time of each, plus a check that the bodies are identical.
+"""
+import argparse
+import statistics
+import time
+
+from flask import Flask, jsonify
+
+from benchmark_export import SyntheticCursor
+from serializers import rows_response
+
+
+def old_path(cursor):
+    columns = [column[0] for column in cursor.description]
+    results = []
+    for row in cursor.fetchall():
+        results.append(dict(zip(columns, row)))
+    return jsonify(results)
+
+
+def new_path(cursor):
+    return rows_response(cursor)
+
+
+def time_path(path, row_count, repeat):
+    timings = []
+    body = None
+    for _ in range(repeat):
+        # Build the rows outside the timed section
+        rows = SyntheticCursor(row_count).fetchall()
+        cursor = SyntheticCursor(0)
+        cursor.fetchall = lambda: rows
+        start = time.perf_counter()
+        body = path(cursor).get_data()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    with app.app_context():
+        print(f"{'rows':>8} | {'jsonify ms':>10} | {'serializer ms':>13} | {'speedup':>7} | same output")
+        print("-" * 62)
+        for row_count in args.rows:
+            old_ms, old_body = time_path(old_path, row_count, args.repeat)
+            new_ms, new_body = time_path(new_path, row_count, args.repeat)
+            print(f"{row_count:>8} | {old_ms:>10.1f} | {new_ms:>13.1f} | "
+                  f"{old_ms / new_ms:>6.1f}x | {old_body == new_body}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, ttl, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# Caches are grouped by the data they are derived from ("families") so a
+# write path only needs to say what it changed, not which caches exist.
+# Each family also has a version counter that every invalidation bumps.
+_families = defaultdict(list)
+_versions = defaultdict(int)
+_families_lock = threading.Lock()
+
+
+def register(cache, *families):
+    """Clear `cache` whenever any of `families` is invalidated"""
+    with _families_lock:
+        for family in families:
+            _families[family].append(cache)
+    return cache
+
+
+def invalidate(*families):
+    """Record that the given families changed and drop every cache derived from them"""
+    with _families_lock:
+        for family in families:
+            _versions[family] += 1
+        caches = {id(c): c for family in families for c in _families.get(family, ())}
+    for cache in caches.values():
+        cache.clear()
+
+
+def data_versions(*families):
+    """Current version of each family, in the order given"""
+    with _families_lock:
+        return tuple(_versions[family] for family in families)
+
+
+class SnapshotCache:
+    """Holds one loaded value (e.g. a whole small table) until it is cleared or expires.
+
+    get() runs `loader` on a miss; concurrent misses wait for the first
+    loader instead of all querying at once. Every successful reload bumps
+    `version`. A clear() that lands while a load is in flight discards that
+    load's result, so a write is never hidden behind data read before it.
+    """
+
+    def __init__(self, loader, ttl):
+        self.loader = loader
+        self.ttl = ttl
+        self.version = 0
+        self._value = _MISSING
+        self._expires = 0
+        self._cleared = 0  # bumped by clear()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def get(self):
+        value = self._current()
+        if value is not _MISSING:
+            return value
+        with self._load_lock:
+            value = self._current()  # another thread may have loaded it meanwhile
+            if value is not _MISSING:
+                return value
+            with self._lock:
+                cleared = self._cleared
+            value = self.loader()
+            with self._lock:
+                if cleared == self._cleared:
+                    self.version += 1
+                    self._value = value
+                    self._expires = time.monotonic() + self.ttl
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._value = _MISSING
+            self._expires = 0
+            self._cleared += 1
+
+    def _current(self):
+        with self._lock:
+            if self._value is not _MISSING and self._expires > time.monotonic():
+                return self._value
+            return _MISSING
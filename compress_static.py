@@ -0,0 +1,53 @@
+"""Write precompressed .gz and .br variants of the static JS and CSS files.
+
+Usage:
+    python compress_static.py
+
+The compression middleware serves these in place of the originals when the
+client accepts the encoding and the variant is newer than its source. Run
+this after changing anything in static/ (the deploy workflow does it).
+"""
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+EXTENSIONS = ('.js', '.css')
+
+
+def write_variant(path, data):
+    with open(path, 'wb') as file:
+        file.write(data)
+
+
+def main():
+    if brotli is None:
+        print("brotli is not installed; writing gzip variants only")
+
+    for root, _, files in os.walk(STATIC_DIR):
+        for name in files:
+            if not name.endswith(EXTENSIONS):
+                continue
+            source = os.path.join(root, name)
+            with open(source, 'rb') as file:
+                data = file.read()
+
+            # mtime=0 keeps the output byte-identical between runs
+            gz = gzip.compress(data, compresslevel=9, mtime=0)
+            write_variant(source + '.gz', gz)
+            sizes = f"gzip {len(gz)}"
+
+            if brotli is not None:
+                br = brotli.compress(data, quality=11)
+                write_variant(source + '.br', br)
+                sizes += f", br {len(br)}"
+
+            print(f"{os.path.relpath(source, STATIC_DIR)}: {len(data)} -> {sizes}")
+
+
+if __name__ == '__main__':
+    main()
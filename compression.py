@@ -0,0 +1,162 @@
+"""gzip/brotli response compression for the Flask app.
+
+Responses are compressed in an after_request hook when the client accepts
+it, the mimetype is textual and the body is at least COMPRESS_MIN_SIZE
+bytes. Streamed responses (the exports) are compressed chunk by chunk
+with a flush after each one, so they keep streaming. Static files are
+never compressed on the fly; if compress_static.py has produced a .br or
+.gz next to the file, that variant is served instead.
+"""
+import os
+import zlib
+
+from flask import current_app, request, send_from_directory
+
+import config
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'text/csv',
+    'text/css',
+    'text/html',
+    'text/javascript',
+    'text/plain',
+}
+
+# Suffix added to a response's ETag per encoding, since a strong ETag must
+# change whenever the bytes on the wire do
+ETAG_SUFFIXES = {'br': '-br', 'gzip': '-gzip'}
+
+PRECOMPRESSED_EXTENSIONS = {'br': '.br', 'gzip': '.gz'}
+
+
+def init_app(app):
+    app.after_request(compress_response)
+
+
+def available_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate_encoding():
+    """Best encoding the client accepts, or None"""
+    return request.accept_encodings.best_match(available_encodings())
+
+
+def compress_response(response):
+    if request.method == 'HEAD' or response.status_code != 200:
+        return response
+    if 'Content-Encoding' in response.headers or 'Range' in request.headers:
+        return response
+
+    if request.endpoint == 'static':
+        return _precompressed_static(response)
+
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    encoding = negotiate_encoding()
+    _add_vary(response)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.direct_passthrough = False
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config.COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(_compress(data, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+    _suffix_etag(response, encoding)
+    return response
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=config.COMPRESS_BROTLI_QUALITY)
+    compressor = zlib.compressobj(config.COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _compress_stream(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=config.COMPRESS_BROTLI_QUALITY)
+        flush = compressor.flush
+        finish = compressor.finish
+        compress = compressor.process
+    else:
+        compressor = zlib.compressobj(config.COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+        compress = compressor.compress
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            # Flush per chunk so the client receives each batch as it is produced
+            data = compress(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def _precompressed_static(response):
+    filename = request.view_args.get('filename') if request.view_args else None
+    if not filename or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    _add_vary(response)
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    static_folder = current_app.static_folder
+    source = os.path.join(static_folder, filename)
+    variant = source + PRECOMPRESSED_EXTENSIONS[encoding]
+    try:
+        # Ignore variants older than the file they were made from
+        if os.path.getmtime(variant) < os.path.getmtime(source):
+            return response
+    except OSError:
+        return response
+
+    compressed = send_from_directory(
+        static_folder, filename + PRECOMPRESSED_EXTENSIONS[encoding],
+        mimetype=response.mimetype)
+    compressed.headers['Content-Encoding'] = encoding
+    _add_vary(compressed)
+    response.close()
+    return compressed
+
+
+def _add_vary(response):
+    response.vary.add('Accept-Encoding')
+
+
+def _suffix_etag(response, encoding):
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(etag + ETAG_SUFFIXES[encoding], weak=weak)
+
+
+def strip_etag_suffix(etag):
+    """The ETag a view computed, given the (possibly suffixed) one a client sent back"""
+    for suffix in ETAG_SUFFIXES.values():
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)]
+    return etag
@@ -11,3 +11,49 @@ SCOPE = ['User.Read']
 
 # Database Configuration
 DATABASE_URL = os.environ.get('DATABASE_URL')
+
+# Connection Pool Configuration
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 1))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))  # seconds to wait for a free connection
+DB_POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800))  # recycle connections older than this
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300))  # evict connections idle longer than this
+DB_POOL_PING_INTERVAL = float(os.environ.get('DB_POOL_PING_INTERVAL', 30))  # health check connections idle longer than this
+
+# Cache Configuration
+COUNT_CACHE_TTL = float(os.environ.get('COUNT_CACHE_TTL', 300))  # safety net for writes made by other processes
+LOCATIONS_CACHE_TTL = float(os.environ.get('LOCATIONS_CACHE_TTL', 600))
+ETAG_TTL = int(os.environ.get('ETAG_TTL', 300))  # ETags roll over at least this often (seconds)
+
+# Response Compression Configuration
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # bytes; smaller bodies are sent as-is
+COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+
+# Search Index Configuration
+SEARCH_INDEX_TTL = float(os.environ.get('SEARCH_INDEX_TTL', 900))  # full rebuild interval (seconds), 0 to disable
+SEARCH_INDEX_PRELOAD = os.environ.get('SEARCH_INDEX_PRELOAD', '1') == '1'  # build at startup when DATABASE_URL is set
+SUGGEST_TTL = float(os.environ.get('SUGGEST_TTL', 900))  # full reload interval for typeahead tries (seconds), 0 to disable
+
+# Audit Log Configuration
+AUDIT_MODE = os.environ.get('AUDIT_MODE', 'sync')  # 'sync': insert in the request's transaction; 'spool': fsync to a local file, drain in the background
+AUDIT_SPOOL_DIR = os.environ.get('AUDIT_SPOOL_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'audit-spool'))  # beside wwwroot, not in it; one file per process
+AUDIT_SPOOL_BATCH = int(os.environ.get('AUDIT_SPOOL_BATCH', 500))  # rows per drain INSERT
+AUDIT_SPOOL_INTERVAL = float(os.environ.get('AUDIT_SPOOL_INTERVAL', 1.0))  # seconds between drain passes when idle
+AUDIT_SPOOL_ORPHAN_SECONDS = float(os.environ.get('AUDIT_SPOOL_ORPHAN_SECONDS', 300))  # idle .spool files older than this are from dead processes and get drained
+AUDIT_ARCHIVE_DAYS = int(os.environ.get('AUDIT_ARCHIVE_DAYS', 365))  # archive_audit_log.py moves rows older than this out of dbo.AuditLog
+AUDIT_ARCHIVE_PATH = os.environ.get('AUDIT_ARCHIVE_PATH')  # persistent storage outside wwwroot; no default, archiving refuses to run without it
+AUDIT_ARCHIVE_BATCH = int(os.environ.get('AUDIT_ARCHIVE_BATCH', 5000))  # rows moved per transaction
+AUDIT_ARCHIVE_RESCAN = float(os.environ.get('AUDIT_ARCHIVE_RESCAN', 60))  # how often readers look for new segments (seconds)
+LOANER_AVAILABILITY_TTL = float(os.environ.get('LOANER_AVAILABILITY_TTL', 300))  # reload interval for the available-loaner index (seconds)
+LOANER_DEFAULT_LOAN_DAYS = int(os.environ.get('LOANER_DEFAULT_LOAN_DAYS', 7))  # loan length assumed for waitlist assignments without a return date
+OVERDUE_TTL = float(os.environ.get('OVERDUE_TTL', 300))  # longest the overdue list is kept without a recompute (seconds)
+OVERDUE_RETRY_SECONDS = float(os.environ.get('OVERDUE_RETRY_SECONDS', 30))  # delay before the overdue job retries a failed load
+OVERDUE_JOB = os.environ.get('OVERDUE_JOB', '1') == '1'  # recompute overdue loaners in the background when DATABASE_URL is set
+LOANER_STATS_MAX_DAYS = int(os.environ.get('LOANER_STATS_MAX_DAYS', 731))  # longest period /api/loaners/stats accepts
+
+# Server-Sent Events Configuration
+EVENTS_RETRY_MS = int(os.environ.get('EVENTS_RETRY_MS', 3000))  # how often EventSource polls /api/events
+EVENTS_BATCH = int(os.environ.get('EVENTS_BATCH', 500))  # most events sent per poll; the rest follow on the next
+EVENTS_RETENTION_HOURS = int(os.environ.get('EVENTS_RETENTION_HOURS', 24))  # older rows are pruned from dbo.ChangeEvents
+EVENTS_PRUNE_EVERY = int(os.environ.get('EVENTS_PRUNE_EVERY', 100))  # prune after every Nth event write per process
@@ -0,0 +1,292 @@
+import os
+import threading
+import time
+from collections import deque
+
+import pyodbc
+from flask import g
+
+import config
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became free within the checkout timeout"""
+
+
+class PooledConnection:
+    """Wraps a pyodbc connection so that close() hands it back to the pool"""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def cursor(self):
+        return self._raw.cursor()
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        """Return the connection to the pool instead of closing it; later calls do nothing"""
+        if self._raw is not None:
+            self._pool.release(self)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class ConnectionPool:
+    """Thread-safe pool of pyodbc connections.
+
+    Idle connections are handed out most-recently-used first, so the ones at
+    the bottom of the stack age out through the idle timeout. Connections are
+    pinged on checkout when they have been idle for longer than
+    ping_interval, and replaced once they pass max_lifetime.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=30,
+                 max_lifetime=1800, idle_timeout=300, ping_interval=30):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Invalid pool size: min_size=%s, max_size=%s" % (min_size, max_size))
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+
+        self._idle = deque()
+        self._size = 0  # open connections, idle and in use
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'failed_health_checks': 0,
+            'waits': 0,
+            'timeouts': 0,
+        }
+
+    def acquire(self):
+        """Check out a healthy connection, opening one if the pool has room"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn = None
+            self._evict_idle()
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            "No database connection available after %.1fs" % self.timeout)
+                    self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn = self._idle.pop()
+                else:
+                    self._size += 1  # reserve the slot before connecting outside the lock
+
+            if conn is None:
+                return self._open()
+
+            if self._expired(conn) or not self._healthy(conn):
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self._stats['checkouts'] += 1
+            return conn
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding it if it is unusable.
+
+        The pool keeps the raw connection in a new wrapper and detaches the
+        caller's, so a second close() on the old handle cannot hand the same
+        connection to the pool twice or touch it after another thread has
+        checked it out.
+        """
+        raw, conn._raw = conn._raw, None
+        if raw is None:
+            return
+        pooled = PooledConnection(self, raw)
+        pooled.created_at = conn.created_at
+        try:
+            raw.rollback()  # never hand out a connection with an open transaction
+        except pyodbc.Error:
+            self._discard(pooled)
+            return
+
+        if self._expired(pooled):
+            self._discard(pooled)
+            return
+
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    def stats(self):
+        """Return a snapshot of pool counters"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+            stats['min_size'] = self.min_size
+            stats['max_size'] = self.max_size
+        return stats
+
+    def close_all(self):
+        """Close every idle connection; checked out ones close on release"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn in idle:
+            self._discard(conn, recycled=False)
+
+    def _open(self):
+        try:
+            raw = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['created'] += 1
+            self._stats['checkouts'] += 1
+        return PooledConnection(self, raw)
+
+    def _discard(self, conn, recycled=True):
+        raw, conn._raw = conn._raw, None
+        try:
+            if raw is not None:
+                raw.close()
+        except pyodbc.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            if recycled:
+                self._stats['recycled'] += 1
+            self._cond.notify()
+
+    def _expired(self, conn):
+        return self.max_lifetime and time.monotonic() - conn.created_at > self.max_lifetime
+
+    def _healthy(self, conn):
+        if time.monotonic() - conn.last_used < self.ping_interval:
+            return True
+        try:
+            cursor = conn._raw.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            with self._cond:
+                self._stats['failed_health_checks'] += 1
+            return False
+
+    def _evict_idle(self):
+        """Close connections idle past idle_timeout, keeping min_size open"""
+        if not self.idle_timeout:
+            return
+        evicted = []
+        with self._cond:
+            now = time.monotonic()
+            # The oldest idle connections sit at the left end of the deque
+            while (self._idle and self._size > self.min_size
+                   and now - self._idle[0].last_used > self.idle_timeout):
+                conn = self._idle.popleft()
+                raw, conn._raw = conn._raw, None
+                evicted.append(raw)
+                self._size -= 1
+                self._stats['recycled'] += 1
+                self._cond.notify()
+        # Closing talks to the server; other threads need not wait for it
+        for raw in evicted:
+            try:
+                raw.close()
+            except pyodbc.Error:
+                pass
+
+
+def _connect():
+    conn_str = os.getenv('DATABASE_URL')
+    if not conn_str:
+        raise ValueError("DATABASE_URL environment variable is not set")
+    if isinstance(conn_str, bytes):
+        conn_str = conn_str.decode('utf-8')
+    return pyodbc.connect(conn_str)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    _connect,
+                    min_size=config.DB_POOL_MIN_SIZE,
+                    max_size=config.DB_POOL_MAX_SIZE,
+                    timeout=config.DB_POOL_TIMEOUT,
+                    max_lifetime=config.DB_POOL_MAX_LIFETIME,
+                    idle_timeout=config.DB_POOL_IDLE_TIMEOUT,
+                    ping_interval=config.DB_POOL_PING_INTERVAL,
+                )
+    return _pool
+
+
+_request_stats = {'requests': 0, 'requests_without_db': 0}
+_request_stats_lock = threading.Lock()
+
+
+def get_db():
+    """Return this request's connection, checking one out of the pool on first use"""
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+
+def rollback_db():
+    """Roll back this request's transaction, if it ever took a connection.
+
+    For error handlers: calling get_db() there would check a connection out
+    just to roll it back, and raise again when the error was a PoolTimeout.
+    """
+    db = g.get('db')
+    if db is None:
+        return
+    try:
+        db.rollback()
+    except pyodbc.Error:
+        pass  # release() discards a connection that cannot roll back
+
+
+def close_db(exception=None):
+    """Return the request's connection to the pool, if it ever took one"""
+    db = g.pop('db', None)
+    with _request_stats_lock:
+        _request_stats['requests'] += 1
+        if db is None:
+            _request_stats['requests_without_db'] += 1
+    if db is not None:
+        db.close()
+
+
+def request_stats():
+    """Return how many requests finished, and how many never touched the database"""
+    with _request_stats_lock:
+        return dict(_request_stats)
@@ -0,0 +1,60 @@
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from flask import make_response, request
+
+import config
+from compression import strip_etag_suffix
+from cache import data_versions
+
+# Versions only live in this process, so ETags are scoped to it: a tag issued
+# by another worker (or before a restart) never matches here. Writes made by
+# other workers are not seen at all, so every tag also expires after ETAG_TTL.
+_PROCESS_ID = uuid.uuid4().hex
+
+
+def current_etag(families):
+    """Strong ETag for this request's path and query under the given data versions"""
+    versions = data_versions(*families)
+    window = int(time.time() // config.ETAG_TTL) if config.ETAG_TTL else 0
+    query = sorted(request.args.items(multi=True))
+    key = repr((_PROCESS_ID, window, families, versions, request.path, query))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def conditional(*families):
+    """Answer GETs with 304 when If-None-Match matches, without calling the view.
+
+    `families` are the cache.invalidate() families the response is built
+    from; any write to one of them changes the ETag.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Computed before the view runs: a write that lands mid-request
+            # leaves this response with the older tag, never the newer one
+            etag = current_etag(families)
+            matched = _matching_tag(etag)
+            if matched:
+                # Echo the client's tag, which may carry a compression suffix
+                response = make_response('', 304)
+                etag = matched
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Let browsers keep the body but revalidate it on every use
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def _matching_tag(etag):
+    for tag in request.if_none_match.as_set():
+        if strip_etag_suffix(tag) == etag:
+            return tag
+    return None
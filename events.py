@@ -0,0 +1,124 @@
+"""Change notifications shared by every process.
+
+Write routes publish() a small event before they commit. Like audit events,
+the events are collected on flask.g and audit.commit() inserts them into
+dbo.ChangeEvents (create_change_events.sql) in the same transaction, so an
+event exists exactly when its change does, whichever FastCGI process
+handled the write.
+
+/api/events serves them as Server-Sent Events. Each request answers at once
+with the events after the client's Last-Event-ID and ends; EventSource
+reconnects after the `retry` delay, so the feed is a cheap poll of the
+clustered index and no worker is ever held by an idle subscriber.
+"""
+import itertools
+import json
+
+from flask import g
+
+import config
+
+# IDENTITY values are allocated at INSERT but become visible at COMMIT, so an
+# id can appear after a larger one. A reader stops at a gap until the row
+# after it is older than this, when the missing id is taken as rolled back.
+GAP_GRACE_MS = 5000
+
+INSERT_EVENTS_SQL = """
+    INSERT INTO dbo.ChangeEvents (event_type, payload)
+    SELECT event_type, payload
+    FROM OPENJSON(?) WITH (event_type VARCHAR(50), payload NVARCHAR(MAX))
+"""
+
+EVENTS_AFTER_QUERY = """
+    SELECT TOP (?) event_id, event_type, payload,
+           DATEDIFF_BIG(millisecond, created_at, SYSUTCDATETIME())
+    FROM dbo.ChangeEvents
+    WHERE event_id > ?
+    ORDER BY event_id
+"""
+
+EVENT_RANGE_QUERY = "SELECT MIN(event_id), MAX(event_id) FROM dbo.ChangeEvents"
+
+# Where a new subscriber starts: before any event that could still be
+# overtaken by a slower commit (replaying a few is harmless, missing one is not)
+START_POSITION_QUERY = """
+    SELECT MAX(event_id) FROM dbo.ChangeEvents
+    WHERE created_at < DATEADD(millisecond, 0 - ?, SYSUTCDATETIME())
+"""
+
+PRUNE_EVENTS_SQL = """
+    DELETE TOP (1000) FROM dbo.ChangeEvents
+    WHERE created_at < DATEADD(hour, 0 - ?, SYSUTCDATETIME())
+"""
+
+
+def publish(event_type, **data):
+    """Queue an event for this request; audit.commit() writes it with the change"""
+    events = g.setdefault('change_events', [])
+    events.append((event_type, data))
+
+
+def flush(cursor):
+    """Write this request's queued events (called by audit.commit before committing)"""
+    write(cursor, g.pop('change_events', []))
+
+
+def write(cursor, events):
+    """Insert (event_type, data) pairs; the caller commits"""
+    if not events:
+        return
+    cursor.execute(INSERT_EVENTS_SQL, json.dumps([
+        {'event_type': event_type, 'payload': json.dumps(data, default=_plain, separators=(',', ':'))}
+        for event_type, data in events
+    ]))
+    # Trim old events now and then, a bounded batch at a time
+    if next(_writes) % config.EVENTS_PRUNE_EVERY == 0:
+        cursor.execute(PRUNE_EVENTS_SQL, config.EVENTS_RETENTION_HOURS)
+
+
+def read_after(cursor, last_event_id, limit):
+    """Committed events after last_event_id, as (event_id, event_type, payload JSON).
+
+    Returns None when the client must refetch everything instead: its id is
+    older than the retained events, or newer than any (the table was reset).
+    """
+    cursor.execute(EVENT_RANGE_QUERY)
+    oldest, newest = cursor.fetchone()
+    if last_event_id > (newest or 0) or (oldest is not None and last_event_id < oldest - 1):
+        return None
+
+    cursor.execute(EVENTS_AFTER_QUERY, (limit, last_event_id))
+    events = []
+    expected = last_event_id + 1
+    for event_id, event_type, payload, age_ms in cursor.fetchall():
+        if event_id != expected and age_ms < GAP_GRACE_MS:
+            break  # an earlier id may still be committing
+        events.append((event_id, event_type, payload))
+        expected = event_id + 1
+    return events
+
+
+def start_position(cursor):
+    """Event id a new subscriber should resume after; always one read_after accepts"""
+    cursor.execute(START_POSITION_QUERY, GAP_GRACE_MS)
+    position = cursor.fetchone()[0]
+    if position is None:
+        # Every retained event is still within the grace period: start just
+        # before the oldest, not at 0, which pruning may have left behind
+        cursor.execute(EVENT_RANGE_QUERY)
+        oldest = cursor.fetchone()[0]
+        position = oldest - 1 if oldest is not None else 0
+    return position
+
+
+def format_event(event_id, event_type, payload):
+    return f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n"
+
+
+_writes = itertools.count(1)
+
+
+def _plain(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
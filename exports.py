@@ -0,0 +1,64 @@
+import csv
+import io
+from datetime import date, datetime, time
+
+from serializers import ISO_DATES, columns_of, encode_row, row_layout
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def iter_export(cursor, export_format, batch_size=EXPORT_BATCH_SIZE):
+    """Stream the rows of an executed cursor in the given format.
+
+    Rows are pulled with fetchmany(batch_size) and every batch is encoded
+    and yielded before the next one is fetched, so memory use depends on
+    the batch size and not on the number of rows.
+    """
+    if export_format == 'ndjson':
+        return iter_ndjson(cursor, batch_size)
+    if export_format == 'csv':
+        return iter_csv(cursor, batch_size)
+    raise ValueError(f'Unsupported export format: {export_format}')
+
+
+def iter_ndjson(cursor, batch_size=EXPORT_BATCH_SIZE):
+    """Yield one JSON object per line"""
+    layout = row_layout(columns_of(cursor))
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield ''.join([encode_row(row, layout, ISO_DATES) + '\n' for row in rows])
+
+
+def iter_csv(cursor, batch_size=EXPORT_BATCH_SIZE):
+    """Yield a header line followed by the rows as CSV"""
+    columns = columns_of(cursor)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield _drain(buffer)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield _drain(buffer)
+
+
+def _drain(buffer):
+    chunk = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return chunk
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
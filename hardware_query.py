@@ -0,0 +1,58 @@
+"""Column, sort and filter tables of the /api/hardware queries.
+
+Kept apart from app.py so that tools such as benchmark_pagination.py can
+build the same queries without importing the app, which starts the index
+preload threads when DATABASE_URL is set.
+"""
+from pagination import SortKey
+
+# Columns a client may request through `fields`, in default response order
+HARDWARE_FIELDS = {
+    'inventory_id': 'i.inventory_id',
+    'site_name': 'l.site_name',
+    'room_number': 'l.room_number',
+    'room_name': 'l.room_name',
+    'room_type': 'l.room_type',
+    'asset_tag': 'i.asset_tag',
+    'asset_type': 'i.asset_type',
+    'model': 'i.model',
+    'serial_number': 'i.serial_number',
+    'notes': 'i.notes',
+    'assigned_to': 'i.assigned_to',
+    'date_assigned': 'i.date_assigned',
+    'date_decommissioned': 'i.date_decommissioned',
+    'is_loaner': 'i.is_loaner',
+}
+
+HARDWARE_SORT_KEYS = [
+    SortKey('site_name', 'l.site_name', False, False),
+    SortKey('room_number', 'l.room_number', False, False),
+    SortKey('asset_tag', 'i.asset_tag', False, True),
+    SortKey('inventory_id', 'i.inventory_id', False, False),  # tiebreaker for duplicate tags
+]
+
+# Columns a client may sort on through `sort`, e.g. ?sort=-date_assigned,asset_tag.
+# The free-text notes column is left out: it is in no index.
+NON_NULL_FIELDS = {'inventory_id', 'site_name', 'room_number', 'room_name', 'room_type', 'is_loaner'}
+HARDWARE_SORTABLE = {
+    field: SortKey(field, expr, False, field not in NON_NULL_FIELDS)
+    for field, expr in HARDWARE_FIELDS.items()
+    if field != 'notes'
+}
+
+# Filters a client may combine on the list, count and export queries.
+# text: exact match, repeat the parameter to match any of several values
+# flag: true/false, compiled to literal SQL so filtered indexes can match
+# from / to: inclusive YYYY-MM-DD bounds
+HARDWARE_FILTERS = {
+    'site': ('text', 'l.site_name'),
+    'room_type': ('text', 'l.room_type'),
+    'asset_type': ('text', 'i.asset_type'),
+    'assigned_to': ('text', 'i.assigned_to'),
+    'is_loaner': ('flag', ('i.is_loaner = 0', 'i.is_loaner = 1')),
+    'decommissioned': ('flag', ('i.date_decommissioned IS NULL', 'i.date_decommissioned IS NOT NULL')),
+    'date_assigned_from': ('from', 'i.date_assigned'),
+    'date_assigned_to': ('to', 'i.date_assigned'),
+    'date_decommissioned_from': ('from', 'i.date_decommissioned'),
+    'date_decommissioned_to': ('to', 'i.date_decommissioned'),
+}
@@ -0,0 +1,14 @@
+-- Oldest-first scan of dbo.AuditLog for the archiver (archive_audit_log.py).
+-- Each batch reads the oldest rows below the cutoff in (changed_at, audit_id)
+-- order, so without this index every batch would scan the whole table.
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_AuditLog_ChangedAt'
+    AND object_id = OBJECT_ID(N'dbo.AuditLog')
+)
+BEGIN
+    CREATE INDEX IX_AuditLog_ChangedAt
+    ON dbo.AuditLog(changed_at, audit_id);
+END;
+GO
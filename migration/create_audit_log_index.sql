@@ -0,0 +1,17 @@
+-- One asset's audit history, newest first, for /api/hardware/<asset_tag>/audit.
+-- Each page is a seek to (asset_tag, changed_at, audit_id) followed by a
+-- short range scan, so it costs the same however long the history is.
+-- The from/to filters narrow the same range; action_type is checked from
+-- the included column without touching the table.
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_AuditLog_AssetTag_ChangedAt'
+    AND object_id = OBJECT_ID(N'dbo.AuditLog')
+)
+BEGIN
+    CREATE INDEX IX_AuditLog_AssetTag_ChangedAt
+    ON dbo.AuditLog(asset_tag, changed_at DESC, audit_id DESC)
+    INCLUDE (action_type);
+END;
+GO
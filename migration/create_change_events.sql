@@ -0,0 +1,26 @@
+-- Change feed behind /api/events (events.py). Write routes insert a row in
+-- the same transaction as the change it describes; every app process then
+-- reads the feed by seeking the clustered key past the client's last id.
+-- Rows older than EVENTS_RETENTION_HOURS are pruned by the writers.
+
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'ChangeEvents')
+BEGIN
+    CREATE TABLE dbo.ChangeEvents (
+        event_id BIGINT IDENTITY(1,1) NOT NULL CONSTRAINT PK_ChangeEvents PRIMARY KEY,
+        event_type VARCHAR(50) NOT NULL,
+        payload NVARCHAR(MAX) NOT NULL,
+        created_at DATETIME2 NOT NULL CONSTRAINT DF_ChangeEvents_CreatedAt DEFAULT SYSUTCDATETIME()
+    );
+END;
+GO
+
+-- Pruning and the start position of new subscribers filter on created_at
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_ChangeEvents_CreatedAt'
+    AND object_id = OBJECT_ID(N'dbo.ChangeEvents')
+)
+BEGIN
+    CREATE INDEX IX_ChangeEvents_CreatedAt ON dbo.ChangeEvents(created_at);
+END;
+GO
@@ -0,0 +1,88 @@
+-- Supporting indexes for the /api/hardware filters and sorts.
+-- Each leads with a filter column and carries the grid columns, so common
+-- filters (and their default site/room/tag order) seek instead of scanning
+-- the inventory. The site filter and the default sort are already served by
+-- UQ_Location and IX_Inventory_Location_AssetTag (create_hardware_grid_indexes.sql).
+
+-- ?asset_type=
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_Inventory_AssetType'
+    AND object_id = OBJECT_ID(N'dbo.Formatted_Company_Inventory')
+)
+BEGIN
+    CREATE INDEX IX_Inventory_AssetType
+    ON dbo.Formatted_Company_Inventory(asset_type, location_id, asset_tag, inventory_id)
+    INCLUDE (model, serial_number, assigned_to, date_assigned, date_decommissioned, is_loaner);
+END;
+GO
+
+-- ?assigned_to=
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_Inventory_AssignedTo'
+    AND object_id = OBJECT_ID(N'dbo.Formatted_Company_Inventory')
+)
+BEGIN
+    CREATE INDEX IX_Inventory_AssignedTo
+    ON dbo.Formatted_Company_Inventory(assigned_to, location_id, asset_tag, inventory_id)
+    INCLUDE (asset_type, model, serial_number, date_assigned, date_decommissioned, is_loaner);
+END;
+GO
+
+-- ?date_assigned_from=&date_assigned_to= and ?sort=-date_assigned
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_Inventory_DateAssigned'
+    AND object_id = OBJECT_ID(N'dbo.Formatted_Company_Inventory')
+)
+BEGIN
+    CREATE INDEX IX_Inventory_DateAssigned
+    ON dbo.Formatted_Company_Inventory(date_assigned, inventory_id)
+    INCLUDE (location_id, asset_tag, asset_type, model, serial_number, assigned_to, date_decommissioned, is_loaner);
+END;
+GO
+
+-- ?decommissioned=true and the decommissioned date range
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_Inventory_DateDecommissioned'
+    AND object_id = OBJECT_ID(N'dbo.Formatted_Company_Inventory')
+)
+BEGIN
+    CREATE INDEX IX_Inventory_DateDecommissioned
+    ON dbo.Formatted_Company_Inventory(date_decommissioned, inventory_id)
+    INCLUDE (location_id, asset_tag)
+    WHERE date_decommissioned IS NOT NULL;
+END;
+GO
+
+-- ?decommissioned=false, the usual view of the grid: active items only.
+-- Filtered indexes only match literal predicates, which is why the flag
+-- filters are compiled to SQL text rather than parameters.
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_Inventory_Active_Location_AssetTag'
+    AND object_id = OBJECT_ID(N'dbo.Formatted_Company_Inventory')
+)
+BEGIN
+    CREATE INDEX IX_Inventory_Active_Location_AssetTag
+    ON dbo.Formatted_Company_Inventory(location_id, asset_tag, inventory_id)
+    INCLUDE (asset_type, model, serial_number, assigned_to, date_assigned, is_loaner)
+    WHERE date_decommissioned IS NULL;
+END;
+GO
+
+-- ?is_loaner=true
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_Inventory_Loaners_Location_AssetTag'
+    AND object_id = OBJECT_ID(N'dbo.Formatted_Company_Inventory')
+)
+BEGIN
+    CREATE INDEX IX_Inventory_Loaners_Location_AssetTag
+    ON dbo.Formatted_Company_Inventory(location_id, asset_tag, inventory_id)
+    INCLUDE (asset_type, model, serial_number, assigned_to, date_assigned, date_decommissioned)
+    WHERE is_loaner = 1;
+END;
+GO
@@ -0,0 +1,27 @@
+-- Covering indexes for the /api/hardware grid.
+-- Projected requests (?fields=...) that leave out the free-text notes column
+-- can be answered from these indexes without key lookups into the base table.
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_Inventory_Location_AssetTag'
+    AND object_id = OBJECT_ID(N'dbo.Formatted_Company_Inventory')
+)
+BEGIN
+    CREATE INDEX IX_Inventory_Location_AssetTag
+    ON dbo.Formatted_Company_Inventory(location_id, asset_tag, inventory_id)
+    INCLUDE (asset_type, model, serial_number, assigned_to, date_assigned, date_decommissioned, is_loaner);
+END;
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_Locations_RoomType'
+    AND object_id = OBJECT_ID(N'dbo.Locations')
+)
+BEGIN
+    CREATE INDEX IX_Locations_RoomType
+    ON dbo.Locations(room_type)
+    INCLUDE (site_name, room_number, room_name);
+END;
+GO
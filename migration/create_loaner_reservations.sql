@@ -0,0 +1,65 @@
+-- Future reservations of loaner devices, and a first-come waitlist per asset_type.
+-- Used by the scheduling endpoints in routes/loaner_routes.py.
+
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'LoanerReservations')
+BEGIN
+    CREATE TABLE dbo.LoanerReservations (
+        reservation_id INT IDENTITY(1,1) PRIMARY KEY,
+        inventory_id INT NOT NULL,
+        user_name VARCHAR(100) NOT NULL,
+        start_date DATETIME NOT NULL,
+        end_date DATETIME NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'active',  -- active, fulfilled, cancelled
+        notes VARCHAR(500) NULL,
+        created_at DATETIME NOT NULL DEFAULT GETDATE(),
+        CONSTRAINT FK_LoanerReservations_Inventory
+            FOREIGN KEY (inventory_id)
+            REFERENCES dbo.Formatted_Company_Inventory(inventory_id),
+        CONSTRAINT CK_LoanerReservations_Window CHECK (end_date > start_date)
+    );
+END;
+GO
+
+-- Overlap checks for one device: start_date < @end AND end_date > @start
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_LoanerReservations_Active'
+    AND object_id = OBJECT_ID(N'dbo.LoanerReservations')
+)
+BEGIN
+    CREATE INDEX IX_LoanerReservations_Active
+    ON dbo.LoanerReservations(inventory_id, start_date)
+    INCLUDE (end_date, user_name)
+    WHERE status = 'active';
+END;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'LoanerWaitlist')
+BEGIN
+    CREATE TABLE dbo.LoanerWaitlist (
+        waitlist_id INT IDENTITY(1,1) PRIMARY KEY,
+        asset_type VARCHAR(100) NOT NULL,
+        user_name VARCHAR(100) NOT NULL,
+        expected_return_date DATETIME NULL,
+        notes VARCHAR(500) NULL,
+        requested_at DATETIME NOT NULL DEFAULT GETDATE(),
+        status VARCHAR(20) NOT NULL DEFAULT 'waiting',  -- waiting, assigned, cancelled
+        assigned_checkout_id INT NULL,
+        assigned_at DATETIME NULL
+    );
+END;
+GO
+
+-- Next in line for an asset_type
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_LoanerWaitlist_Waiting'
+    AND object_id = OBJECT_ID(N'dbo.LoanerWaitlist')
+)
+BEGIN
+    CREATE INDEX IX_LoanerWaitlist_Waiting
+    ON dbo.LoanerWaitlist(asset_type, requested_at, waitlist_id)
+    INCLUDE (user_name, expected_return_date)
+    WHERE status = 'waiting';
+END;
+GO
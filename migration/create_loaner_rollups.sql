@@ -0,0 +1,33 @@
+-- Daily loaner usage aggregates behind /api/loaners/stats (rollups.py).
+-- The checkout and checkin routes update them in the same transaction as
+-- the checkout row; backfill_loaner_rollups.py rebuilds them from
+-- dbo.LoanerCheckouts. Days are calendar days of the stored (UTC) times.
+
+-- One row per device per day with activity. Loans are counted on the day
+-- they start (checkouts) and on the day they end (returns, loan_minutes).
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'LoanerDailyUsage')
+BEGIN
+    CREATE TABLE dbo.LoanerDailyUsage (
+        usage_date DATE NOT NULL,
+        inventory_id INT NOT NULL,
+        asset_tag VARCHAR(50) NULL,
+        asset_type VARCHAR(100) NULL,
+        checkouts INT NOT NULL DEFAULT 0,
+        returns INT NOT NULL DEFAULT 0,
+        loan_minutes BIGINT NOT NULL DEFAULT 0,  -- total length of the loans returned that day
+        CONSTRAINT PK_LoanerDailyUsage PRIMARY KEY (usage_date, inventory_id)
+    );
+END;
+GO
+
+-- One row per day with activity. A day without a row had no checkouts or
+-- checkins, so its peak is the open_at_end of the latest earlier row.
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'LoanerDailyPeak')
+BEGIN
+    CREATE TABLE dbo.LoanerDailyPeak (
+        usage_date DATE NOT NULL PRIMARY KEY,
+        peak_concurrent INT NOT NULL,  -- most loans open at once during the day
+        open_at_end INT NOT NULL       -- loans still open after the day's last event
+    );
+END;
+GO
@@ -0,0 +1,26 @@
+-- At most one open checkout per loaner device.
+-- checkout_loaner relies on this index to reject the second of two
+-- concurrent checkouts of the same device, and the availability index
+-- reads open checkouts through it.
+
+-- Any device listed here has several open checkouts; close the extra ones
+-- (set checkin_date) before creating the index, or it will fail.
+SELECT inventory_id, COUNT(*) AS open_checkouts
+FROM dbo.LoanerCheckouts
+WHERE checkin_date IS NULL
+GROUP BY inventory_id
+HAVING COUNT(*) > 1;
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'UX_LoanerCheckouts_Open'
+    AND object_id = OBJECT_ID(N'dbo.LoanerCheckouts')
+)
+BEGIN
+    CREATE UNIQUE INDEX UX_LoanerCheckouts_Open
+    ON dbo.LoanerCheckouts(inventory_id)
+    INCLUDE (checkout_id, user_name, checkout_date, expected_return_date)
+    WHERE checkin_date IS NULL;
+END;
+GO
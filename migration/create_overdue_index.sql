@@ -0,0 +1,18 @@
+-- Due dates of open checkouts, for the overdue-loaner job (overdue.py).
+-- Both of its queries are range seeks on this index: open checkouts due
+-- before now (the overdue list) and the earliest due date after now (when
+-- the list next changes). Closed checkouts are left out, so the index stays
+-- as small as the number of devices currently on loan.
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_LoanerCheckouts_Open_Due'
+    AND object_id = OBJECT_ID(N'dbo.LoanerCheckouts')
+)
+BEGIN
+    CREATE INDEX IX_LoanerCheckouts_Open_Due
+    ON dbo.LoanerCheckouts(expected_return_date)
+    INCLUDE (inventory_id, user_name, checkout_date, checkout_notes)
+    WHERE checkin_date IS NULL;
+END;
+GO
@@ -0,0 +1,16 @@
+-- Overdue loaners already announced on the change feed (overdue.py). Every
+-- app process runs the overdue job; the first to see a checkout pass its due
+-- date inserts it here and publishes 'loaner.overdue', the others find the
+-- row and stay quiet. The due date is part of the key, so a loan that is
+-- extended and then falls overdue again is announced again.
+
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'LoanerOverdueNotices')
+BEGIN
+    CREATE TABLE dbo.LoanerOverdueNotices (
+        checkout_id INT NOT NULL,
+        expected_return_date DATETIME NOT NULL,
+        notified_at DATETIME2 NOT NULL CONSTRAINT DF_LoanerOverdueNotices_NotifiedAt DEFAULT SYSUTCDATETIME(),
+        CONSTRAINT PK_LoanerOverdueNotices PRIMARY KEY (checkout_id, expected_return_date)
+    );
+END;
+GO
@@ -0,0 +1,188 @@
+"""Overdue loaner checkouts.
+
+OverdueLoaners caches the open checkouts whose expected_return_date has
+passed, already encoded as JSON, for /api/loaners/overdue. The list only
+changes when a checkout changes or when the clock reaches the next due
+date, so it is recomputed on exactly those events: the cache is registered
+with the 'loaners' family (every checkout/checkin invalidates it), and each
+load also reads the earliest due date still in the future and expires the
+result when that moment arrives. OVERDUE_TTL bounds how long writes from
+other processes can go unnoticed.
+
+Both queries are range seeks on IX_LoanerCheckouts_Open_Due
+(create_overdue_index.sql). A background job recomputes the list as soon
+as it goes stale, so requests normally find it ready, and publishes a
+'loaner.overdue' event for checkouts that have just become overdue. Every
+process runs the job, so the event is claimed through
+dbo.LoanerOverdueNotices (create_overdue_notices.sql) and goes out once.
+"""
+import json
+import threading
+import time
+
+import config
+from cache import register
+from db_pool import get_pool
+import events
+from serializers import columns_of, encode_rows
+
+OVERDUE_QUERY = """
+    SELECT
+        lc.checkout_id, lc.inventory_id, lc.user_name,
+        lc.checkout_date, lc.expected_return_date, lc.checkout_notes,
+        i.asset_tag, i.asset_type, i.model, i.serial_number,
+        i.site_name, i.room_number,
+        DATEDIFF(day, lc.expected_return_date, GETDATE()) AS days_overdue
+    FROM dbo.LoanerCheckouts lc
+    JOIN dbo.Formatted_Company_Inventory i ON i.inventory_id = lc.inventory_id
+    WHERE lc.checkin_date IS NULL AND lc.expected_return_date < GETDATE()
+    ORDER BY lc.expected_return_date, lc.checkout_id
+"""
+
+# Seconds until the next open checkout falls due, measured by the database
+# clock so local clock skew cannot make the cache expire early or late
+NEXT_DUE_QUERY = """
+    SELECT DATEDIFF_BIG(millisecond, GETDATE(), MIN(expected_return_date)) / 1000.0
+    FROM dbo.LoanerCheckouts
+    WHERE checkin_date IS NULL AND expected_return_date >= GETDATE()
+"""
+
+
+# Claims the given checkouts that are overdue and not yet announced at their
+# current due date, returning them; the applock makes concurrent claims wait
+# so that each checkout is returned to exactly one process
+CLAIM_OVERDUE_SQL = """
+    EXEC sp_getapplock @Resource = 'loaner_overdue_notices', @LockMode = 'Exclusive',
+                       @LockOwner = 'Transaction';
+
+    INSERT INTO dbo.LoanerOverdueNotices (checkout_id, expected_return_date)
+    OUTPUT inserted.checkout_id
+    SELECT lc.checkout_id, lc.expected_return_date
+    FROM dbo.LoanerCheckouts lc
+    WHERE lc.checkout_id IN (SELECT value FROM OPENJSON(?))
+    AND lc.checkin_date IS NULL AND lc.expected_return_date < GETDATE()
+    AND NOT EXISTS (
+        SELECT 1 FROM dbo.LoanerOverdueNotices n
+        WHERE n.checkout_id = lc.checkout_id AND n.expected_return_date = lc.expected_return_date
+    );
+"""
+
+# Notices of returned loans are no longer needed
+PRUNE_NOTICES_SQL = """
+    DELETE n
+    FROM dbo.LoanerOverdueNotices n
+    JOIN dbo.LoanerCheckouts lc ON lc.checkout_id = n.checkout_id
+    WHERE lc.checkin_date IS NOT NULL
+"""
+
+
+class OverdueLoaners:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._encoded = None
+        self._checkout_ids = None  # overdue checkout_ids from the last load
+        self._expires = 0
+        self._cleared = 0
+        self._stale = threading.Event()  # set when the job should recompute
+        self._thread = None
+        self.loads = 0
+
+    def get_json(self, cursor):
+        """JSON array of the overdue checkouts, oldest due date first"""
+        with self._lock:
+            if self._encoded is not None and time.monotonic() < self._expires:
+                return self._encoded
+        with self._load_lock:
+            with self._lock:
+                if self._encoded is not None and time.monotonic() < self._expires:
+                    return self._encoded
+            return self.load(cursor)
+
+    def clear(self):
+        with self._lock:
+            self._expires = 0
+            self._cleared += 1
+        self._stale.set()
+
+    def load(self, cursor):
+        with self._lock:
+            cleared = self._cleared
+        cursor.execute(OVERDUE_QUERY)
+        columns = columns_of(cursor)
+        rows = cursor.fetchall()
+        cursor.execute(NEXT_DUE_QUERY)
+        next_due = cursor.fetchone()[0]
+
+        encoded = encode_rows(columns, rows)
+        checkout_ids = {row[columns.index('checkout_id')] for row in rows}
+        lifetime = self.ttl if next_due is None else min(self.ttl, max(float(next_due), 0))
+        with self._lock:
+            previous, self._checkout_ids = self._checkout_ids, checkout_ids
+            self._encoded = encoded
+            # A clear() during the load means a checkout changed after we read
+            if cleared == self._cleared:
+                self._expires = time.monotonic() + lifetime
+            self.loads += 1
+
+        if checkout_ids - (previous or set()):
+            self._announce(sorted(checkout_ids - (previous or set())))
+        return encoded
+
+    def _announce(self, checkout_ids):
+        # load() may run inside a request whose transaction is not ours to
+        # commit, so the claim and the event use a connection of their own
+        try:
+            conn = get_pool().acquire()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(CLAIM_OVERDUE_SQL, json.dumps(checkout_ids))
+                claimed = sorted(row[0] for row in cursor.fetchall())
+                if claimed:
+                    events.write(cursor, [('loaner.overdue', {'checkout_ids': claimed})])
+                    cursor.execute(PRUNE_NOTICES_SQL)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Could not publish overdue loaners: {str(e)}")
+
+    def start(self):
+        """Start the job that recomputes the list whenever it goes stale"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='overdue-loaners', daemon=True)
+                self._thread.start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'overdue': len(self._checkout_ids or ()),
+                'loads': self.loads,
+                'expires_in': max(self._expires - time.monotonic(), 0)
+            }
+
+    def _run(self):
+        while True:
+            with self._lock:
+                wait = self._expires - time.monotonic()
+            if wait > 0:
+                self._stale.wait(wait)
+            self._stale.clear()
+            try:
+                with self._load_lock:
+                    with self._lock:
+                        if time.monotonic() < self._expires:
+                            continue  # a request reloaded it first
+                    conn = get_pool().acquire()
+                    try:
+                        self.load(conn.cursor())
+                    finally:
+                        conn.close()
+            except Exception as e:
+                print(f"Overdue loaner job failed: {str(e)}")
+                self._stale.wait(config.OVERDUE_RETRY_SECONDS)
+
+
+overdue_loaners = register(OverdueLoaners(config.OVERDUE_TTL), 'loaners', 'hardware', 'locations')
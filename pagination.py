@@ -0,0 +1,115 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import date, datetime
+
+# One column of an ORDER BY used for keyset pagination. The last key in a
+# sort must be unique and non-null (usually the primary key) so that every
+# row has a distinct position. `param` is the placeholder compared against
+# the column; a DATETIME column needs 'CAST(? AS DATETIME)', since pyodbc
+# binds datetimes as DATETIME2 and SQL Server then compares at DATETIME2
+# precision, so a .003/.007 value never equals the cursor's copy of itself.
+SortKey = namedtuple('SortKey', ['column', 'expr', 'descending', 'nullable', 'param'], defaults=('?',))
+
+
+def encode_cursor(values, tag=''):
+    """Encode the sort-key values of the last row on a page as an opaque token"""
+    payload = {'v': [_plain(v) for v in values], 't': tag}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, tag=''):
+    """Decode a token produced by encode_cursor, raising ValueError if it is invalid"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values = payload['v']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Invalid cursor')
+    if payload.get('t', '') != tag or not isinstance(values, list):
+        raise ValueError('Cursor does not match the requested sort order')
+    return values
+
+
+def seek_predicate(keys, values):
+    """Build a WHERE fragment selecting rows that sort after `values`.
+
+    SQL Server sorts NULLs first in ascending order and last in descending
+    order, so nullable keys get explicit IS NULL branches. Returns the SQL
+    fragment and its parameters.
+    """
+    if len(keys) != len(values):
+        raise ValueError('Cursor does not match the requested sort order')
+
+    branches = []
+    params = []
+    equal_sql = []
+    equal_params = []
+    for key, value in zip(keys, values):
+        after_sql, after_params = _after(key, value)
+        if after_sql:
+            branches.append(' AND '.join(equal_sql + [after_sql]))
+            params.extend(equal_params + after_params)
+        if value is None:
+            equal_sql.append('%s IS NULL' % key.expr)
+        else:
+            equal_sql.append('%s = %s' % (key.expr, key.param))
+            equal_params.append(value)
+
+    if not branches:
+        return '1=0', []
+    return '(' + ' OR '.join('(%s)' % b for b in branches) + ')', params
+
+
+def parse_sort(raw, sortable, tiebreaker):
+    """Parse a sort parameter such as "-date_assigned,asset_tag" into SortKeys.
+
+    `sortable` maps each allowed column name to its ascending SortKey; a
+    leading "-" sorts that column descending instead. `tiebreaker` is
+    appended unless the sort already reaches it. Returns the keys and the
+    normalized sort string, which callers use as the cursor tag. Raises
+    ValueError for unknown or repeated columns.
+    """
+    keys = []
+    names = []
+    for part in raw.split(','):
+        part = part.strip()
+        descending = part.startswith('-')
+        column = part.lstrip('+-').strip()
+        if column not in sortable:
+            raise ValueError(f'Unknown sort field: {column}')
+        if column in (key.column for key in keys):
+            raise ValueError(f'Duplicate sort field: {column}')
+        keys.append(sortable[column]._replace(descending=descending))
+        names.append(('-' if descending else '') + column)
+        if column == tiebreaker.column:
+            break  # already unique, later columns could never decide anything
+    else:
+        keys.append(tiebreaker)
+    return keys, ','.join(names)
+
+
+def order_by(keys):
+    """Render the ORDER BY list for a sequence of sort keys"""
+    return ', '.join(
+        '%s %s' % (key.expr, 'DESC' if key.descending else 'ASC') for key in keys
+    )
+
+
+def _after(key, value):
+    if key.descending:
+        if value is None:
+            return None, []  # NULLs sort last, nothing comes after them
+        if key.nullable:
+            return '(%s < %s OR %s IS NULL)' % (key.expr, key.param, key.expr), [value]
+        return '%s < %s' % (key.expr, key.param), [value]
+    if value is None:
+        return '%s IS NOT NULL' % key.expr, []
+    return '%s > %s' % (key.expr, key.param), [value]
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
@@ -0,0 +1,243 @@
+"""Daily loaner usage rollups.
+
+dbo.LoanerDailyUsage counts checkouts, returns and returned loan minutes
+per device per day; dbo.LoanerDailyPeak keeps the most loans open at once
+on each day (create_loaner_rollups.sql). The checkout and checkin routes
+call record_checkout() / record_checkin() inside their transaction, so the
+aggregates commit with the checkout row they describe. backfill() rebuilds
+both tables from dbo.LoanerCheckouts for history recorded before this. It
+must be re-run after dbo.LoanerCheckouts is changed any other way, e.g. by
+a migration or a manual fix, because only the two routes keep the rollups
+current.
+
+/api/loaners/stats reads only these tables, so its cost depends on the
+length of the requested period and the number of devices, not on how much
+checkout history has accumulated.
+"""
+from datetime import date, datetime, timedelta, timezone
+
+# Adds one event to the device's row for the day, then raises the day's peak
+# to the number of open loans around the event (`before` is 1 for a checkin,
+# whose loan was still open just before it).
+#
+# The open-loan count is a statement-level snapshot under read committed
+# snapshot isolation, so it cannot see a concurrent checkout that has not
+# committed yet. The applock queues these counts, and it is held until
+# commit: the MERGE starts after the previous event's transaction has
+# committed, and so counts every event recorded before it. The lock is
+# taken only here, after the checkout row is written, and the snapshot
+# read does not wait on row locks, so it cannot deadlock with the rows
+# other requests have already inserted.
+RECORD_SQL = """
+    MERGE dbo.LoanerDailyUsage WITH (HOLDLOCK) AS target
+    USING (
+        SELECT CAST(? AS DATE) AS usage_date, i.inventory_id, i.asset_tag, i.asset_type,
+               ? AS checkouts, ? AS returns, ? AS loan_minutes
+        FROM dbo.Formatted_Company_Inventory i
+        WHERE i.inventory_id = ?
+    ) AS source
+    ON target.usage_date = source.usage_date AND target.inventory_id = source.inventory_id
+    WHEN MATCHED THEN
+        UPDATE SET
+            checkouts = target.checkouts + source.checkouts,
+            returns = target.returns + source.returns,
+            loan_minutes = target.loan_minutes + source.loan_minutes
+    WHEN NOT MATCHED THEN
+        INSERT (usage_date, inventory_id, asset_tag, asset_type, checkouts, returns, loan_minutes)
+        VALUES (source.usage_date, source.inventory_id, source.asset_tag, source.asset_type,
+                source.checkouts, source.returns, source.loan_minutes);
+
+    EXEC sp_getapplock @Resource = 'loaner_daily_peak', @LockMode = 'Exclusive',
+                       @LockOwner = 'Transaction';
+
+    MERGE dbo.LoanerDailyPeak WITH (HOLDLOCK) AS target
+    USING (
+        SELECT CAST(? AS DATE) AS usage_date, COUNT(*) AS open_loans, COUNT(*) + ? AS around_event
+        FROM dbo.LoanerCheckouts
+        WHERE checkin_date IS NULL
+    ) AS source
+    ON target.usage_date = source.usage_date
+    WHEN MATCHED THEN
+        UPDATE SET
+            peak_concurrent = CASE WHEN source.around_event > target.peak_concurrent
+                                   THEN source.around_event ELSE target.peak_concurrent END,
+            open_at_end = source.open_loans
+    WHEN NOT MATCHED THEN
+        INSERT (usage_date, peak_concurrent, open_at_end)
+        VALUES (source.usage_date, source.around_event, source.open_loans);
+"""
+
+BACKFILL_SQL = """
+    DELETE FROM dbo.LoanerDailyUsage;
+    DELETE FROM dbo.LoanerDailyPeak;
+
+    INSERT INTO dbo.LoanerDailyUsage (
+        usage_date, inventory_id, asset_tag, asset_type, checkouts, returns, loan_minutes
+    )
+    SELECT e.usage_date, e.inventory_id, i.asset_tag, i.asset_type,
+           SUM(e.checkouts), SUM(e.returns), SUM(e.loan_minutes)
+    FROM (
+        SELECT CAST(checkout_date AS DATE) AS usage_date, inventory_id,
+               1 AS checkouts, 0 AS returns, CAST(0 AS BIGINT) AS loan_minutes
+        FROM dbo.LoanerCheckouts
+        UNION ALL
+        SELECT CAST(checkin_date AS DATE), inventory_id,
+               0, 1, DATEDIFF_BIG(minute, checkout_date, checkin_date)
+        FROM dbo.LoanerCheckouts
+        WHERE checkin_date IS NOT NULL
+    ) e
+    LEFT JOIN dbo.Formatted_Company_Inventory i ON i.inventory_id = e.inventory_id
+    GROUP BY e.usage_date, e.inventory_id, i.asset_tag, i.asset_type;
+
+    -- Sweep every checkout (+1) and checkin (-1) in time order. Checkins sort
+    -- first at equal times, so a handover is not counted as two open loans.
+    WITH deltas AS (
+        SELECT checkout_date AS at, 1 AS delta FROM dbo.LoanerCheckouts
+        UNION ALL
+        SELECT checkin_date, -1 FROM dbo.LoanerCheckouts WHERE checkin_date IS NOT NULL
+    ),
+    sweep AS (
+        SELECT CAST(at AS DATE) AS usage_date,
+               SUM(delta) OVER (ORDER BY at, delta ROWS UNBOUNDED PRECEDING) AS open_loans,
+               ROW_NUMBER() OVER (ORDER BY at, delta) AS step
+        FROM deltas
+    ),
+    days AS (
+        SELECT usage_date, MAX(open_loans) AS peak, MIN(step) AS first_step, MAX(step) AS last_step
+        FROM sweep
+        GROUP BY usage_date
+    )
+    INSERT INTO dbo.LoanerDailyPeak (usage_date, peak_concurrent, open_at_end)
+    SELECT d.usage_date,
+           CASE WHEN ISNULL(before_day.open_loans, 0) > d.peak THEN before_day.open_loans ELSE d.peak END,
+           end_of_day.open_loans
+    FROM days d
+    JOIN sweep end_of_day ON end_of_day.step = d.last_step
+    LEFT JOIN sweep before_day ON before_day.step = d.first_step - 1;
+"""
+
+# One grouping set per breakdown plus () for the period total
+USAGE_QUERY = """
+    SELECT
+        usage_date, asset_type, inventory_id, asset_tag,
+        GROUPING(usage_date), GROUPING(asset_type), GROUPING(inventory_id),
+        SUM(checkouts), SUM(returns), SUM(loan_minutes)
+    FROM dbo.LoanerDailyUsage
+    WHERE usage_date >= ? AND usage_date <= ?
+    GROUP BY GROUPING SETS (
+        (usage_date), (asset_type), (inventory_id, asset_tag, asset_type), ()
+    )
+"""
+
+# The period's peak rows, plus the last row before it to carry forward
+PEAK_QUERY = """
+    SELECT usage_date, peak_concurrent, open_at_end
+    FROM dbo.LoanerDailyPeak
+    WHERE usage_date >= ? AND usage_date <= ?
+    UNION ALL
+    SELECT * FROM (
+        SELECT TOP (1) usage_date, peak_concurrent, open_at_end
+        FROM dbo.LoanerDailyPeak
+        WHERE usage_date < ?
+        ORDER BY usage_date DESC
+    ) before_period
+"""
+
+
+def record_checkout(cursor, inventory_id, checkout_date):
+    """Count a new checkout; call after inserting it, in the same transaction"""
+    _record(cursor, inventory_id, checkout_date, 1, 0, 0, 0)
+
+
+def record_checkin(cursor, inventory_id, checkout_date, checkin_date):
+    """Count a returned loan; call after closing it, in the same transaction"""
+    loan_minutes = max(int((checkin_date - checkout_date).total_seconds() // 60), 0)
+    _record(cursor, inventory_id, checkin_date, 0, 1, loan_minutes, 1)
+
+
+def _record(cursor, inventory_id, at, checkouts, returns, loan_minutes, before):
+    cursor.execute(RECORD_SQL, (
+        at, checkouts, returns, loan_minutes, inventory_id,
+        at, before
+    ))
+
+
+def backfill(cursor):
+    """Rebuild both rollup tables from dbo.LoanerCheckouts (caller commits)"""
+    cursor.execute(BACKFILL_SQL)
+
+
+def usage_stats(cursor, start, end):
+    """Loaner usage between two dates (inclusive), from the rollup tables only"""
+    cursor.execute(USAGE_QUERY, (start, end))
+    days = {}
+    by_asset_type = []
+    by_device = []
+    totals = _usage(0, 0, 0)
+    for row in cursor.fetchall():
+        usage_date, asset_type, inventory_id, asset_tag = row[:4]
+        by_day, by_type, by_item = row[4:7]
+        usage = _usage(*row[7:])
+        if not by_day:
+            days[usage_date] = usage
+        elif not by_type and by_item:
+            by_asset_type.append(dict(usage, asset_type=asset_type))
+        elif not by_item:
+            by_device.append(dict(usage, inventory_id=inventory_id, asset_tag=asset_tag, asset_type=asset_type))
+        else:
+            totals = usage
+
+    cursor.execute(PEAK_QUERY, (start, end, start))
+    peaks = {}
+    open_loans = 0
+    for usage_date, peak_concurrent, open_at_end in sorted(cursor.fetchall(), key=lambda row: row[0]):
+        if usage_date < start:
+            open_loans = open_at_end
+        else:
+            peaks[usage_date] = (peak_concurrent, open_at_end)
+
+    daily = []
+    day = start
+    while day <= end:
+        # A day without a peak row had no events, so the open count held all day
+        peak, open_loans = peaks.get(day, (open_loans, open_loans))
+        usage = days.get(day, _usage(0, 0, 0))
+        daily.append(dict(usage, date=day.isoformat(), peak_concurrent=peak))
+        day += timedelta(days=1)
+
+    by_asset_type.sort(key=lambda usage: (-usage['checkouts'], str(usage['asset_type'])))
+    by_device.sort(key=lambda usage: (-usage['checkouts'], usage['inventory_id']))
+    totals['peak_concurrent'] = max((usage['peak_concurrent'] for usage in daily), default=0)
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'totals': totals,
+        'by_asset_type': by_asset_type,
+        'by_device': by_device,
+        'daily': daily
+    }
+
+
+def _usage(checkouts, returns, loan_minutes):
+    loan_minutes = int(loan_minutes or 0)
+    return {
+        'checkouts': int(checkouts or 0),
+        'returns': int(returns or 0),
+        'average_loan_hours': round(loan_minutes / returns / 60, 2) if returns else None
+    }
+
+
+def parse_period(args, max_days, default_days=30):
+    """(start, end) dates from ?from=&to= (YYYY-MM-DD); raises ValueError"""
+    try:
+        # Rollup days follow the database clock, which is UTC on Azure SQL
+        today = datetime.now(timezone.utc).date()
+        end = date.fromisoformat(args['to']) if args.get('to') else today
+        start = date.fromisoformat(args['from']) if args.get('from') else end - timedelta(days=default_days - 1)
+    except ValueError:
+        raise ValueError('from and to must be dates (YYYY-MM-DD)')
+    if start > end:
+        raise ValueError('from must not be after to')
+    if (end - start).days + 1 > max_days:
+        raise ValueError(f'Period is limited to {max_days} days')
+    return start, end
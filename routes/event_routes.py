@@ -0,0 +1,47 @@
+from flask import Blueprint, Response, request
+
+import config
+import events
+from db_pool import get_db
+
+events_bp = Blueprint('event_routes', __name__)
+
+
+@events_bp.route('/api/events')
+def stream_events():
+    """Server-Sent Events of loaner, inventory and location changes.
+
+    Answers immediately with the committed events after Last-Event-ID (or
+    ?last_event_id=) and ends the response; the `retry` field makes
+    EventSource reconnect and ask again after EVENTS_RETRY_MS. A response
+    never waits for new events, so subscribers do not tie up FastCGI
+    workers, and since events live in dbo.ChangeEvents every process serves
+    the same feed.
+    """
+    raw = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(raw) if raw else None
+    except ValueError:
+        last_event_id = -1  # not one of ours; start over with a reset
+
+    try:
+        cursor = get_db().cursor()
+        body = [f"retry: {config.EVENTS_RETRY_MS}\n\n"]
+        if last_event_id is None:
+            # A new client already has the current state; just tell it where it is
+            body.append(f"id: {events.start_position(cursor)}\nevent: position\ndata: {{}}\n\n")
+        else:
+            found = events.read_after(cursor, last_event_id, config.EVENTS_BATCH) if last_event_id >= 0 else None
+            if found is None:
+                # Too far behind (or a stale id): the client should refetch everything
+                body.append(f"id: {events.start_position(cursor)}\nevent: reset\ndata: {{}}\n\n")
+            else:
+                body.extend(events.format_event(*event) for event in found)
+    except Exception as e:
+        # An error status would stop EventSource for good; retry with the same id instead
+        print(f"Event feed query failed: {str(e)}")
+        body = [f"retry: {config.EVENTS_RETRY_MS}\n\n"]
+
+    response = Response(''.join(body), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -1,45 +1,68 @@
 from flask import Blueprint, jsonify, request
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import pyodbc
-from utils import get_db_connection, log_change
+import audit
+import config
+import rollups
+from db_pool import get_db, rollback_db
+from serializers import RawJSON, json_response, rows_response
+from availability import loaner_availability
+from overdue import overdue_loaners
+from scheduling import reservation_schedule
+from cache import TTLCache, invalidate, register
+from etags import conditional
+from events import publish
 
 loaner_bp = Blueprint('loaner_routes', __name__)
 
+# /api/loaners/stats results keyed by period; cleared by checkouts and checkins
+loaner_stats = register(TTLCache(config.COUNT_CACHE_TTL), 'loaners')
+
 @loaner_bp.route('/api/loaners/available')
+@conditional('loaners', 'hardware')
 def get_available_loaners():
-    """Get all available loaner devices"""
+    """Get all available loaner devices, from the in-memory availability index"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM dbo.AvailableLoaners')
-        columns = [column[0] for column in cursor.description]
-        items = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        return jsonify(items)
+        return json_response(RawJSON(loaner_availability.available_json(get_db().cursor())))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 @loaner_bp.route('/api/loaners/checked-out')
+@conditional('loaners', 'hardware')
 def get_checked_out_loaners():
     """Get all currently checked out loaner devices"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        cursor = get_db().cursor()
         
         cursor.execute('SELECT * FROM dbo.CheckedOutLoaners')
-        columns = [column[0] for column in cursor.description]
-        items = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        return jsonify(items)
+        return rows_response(cursor)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@loaner_bp.route('/api/loaners/overdue')
+def get_overdue_loaners():
+    """Open checkouts past their expected return date, oldest first"""
+    try:
+        return json_response(RawJSON(overdue_loaners.get_json(get_db().cursor())))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@loaner_bp.route('/api/loaners/stats')
+def get_loaner_stats():
+    """Usage per day, asset_type and device over ?from=&to=, from the daily rollups"""
+    try:
+        start, end = rollups.parse_period(request.args, config.LOANER_STATS_MAX_DAYS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        result = loaner_stats.get((start, end))
+        if result is None:
+            result = rollups.usage_stats(get_db().cursor(), start, end)
+            loaner_stats.set((start, end), result)
+        return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 @loaner_bp.route('/api/loaners/checkout', methods=['POST'])
 def checkout_loaner():
@@ -50,34 +73,120 @@ def checkout_loaner():
         user_name = data.get('user_name')
         expected_return_date = data.get('expected_return_date')
         notes = data.get('notes')
+        reservation_id = data.get('reservation_id')  # the reservation this checkout fulfils, if any
         
         if not all([inventory_id, user_name]):
             return jsonify({'error': 'Missing required fields'}), 400
+        try:
+            inventory_id = int(inventory_id)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'inventory_id must be an integer'}), 400
+        try:
+            until = _parse_datetime('expected_return_date', expected_return_date) if expected_return_date else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if reservation_id is not None:
+            try:
+                reservation_id = int(reservation_id)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'reservation_id must be an integer'}), 400
             
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        cursor = get_db().cursor()
         
-        # First verify the item is available
-        cursor.execute('''
-            SELECT inventory_id FROM dbo.AvailableLoaners 
-            WHERE inventory_id = ?
-        ''', inventory_id)
+        # Only the holder's own reservation, for this device and open now, lets
+        # the checkout through it; UPDLOCK keeps it from being cancelled meanwhile
+        if reservation_id is not None:
+            cursor.execute('''
+                SELECT 1 FROM dbo.LoanerReservations WITH (UPDLOCK, HOLDLOCK)
+                WHERE reservation_id = ? AND inventory_id = ? AND user_name = ? AND status = 'active'
+                AND start_date <= GETDATE() AND end_date > GETDATE()
+            ''', (reservation_id, inventory_id, user_name))
+            if cursor.fetchone() is None:
+                rollback_db()
+                return jsonify({
+                    'error': 'reservation_id is not an active reservation of this device for this user'
+                }), 400
+        
+        # Someone else's reservation inside the loan period blocks the checkout
+        ignore = ('reservation', reservation_id) if reservation_id is not None else None
+        conflicts = reservation_schedule.conflicts(cursor, inventory_id, _utc_now(), until or datetime.max, ignore)
+        conflicts = [booking for booking in conflicts if booking[2][0] == 'reservation']
+        if conflicts:
+            return jsonify({
+                'error': 'Item is reserved during the requested period',
+                'conflicts': [_booking_json(booking) for booking in conflicts]
+            }), 409
         
-        if not cursor.fetchone():
+        # Create the checkout only if the item is a loaner with no open checkout
+        # and no other active reservation overlapping the loan. The schedule
+        # above is this process's view; the locked re-check here also sees
+        # reservations made through other processes since it was loaded.
+        # UX_LoanerCheckouts_Open rejects the loser if two checkouts race.
+        try:
+            cursor.execute('''
+                INSERT INTO dbo.LoanerCheckouts (
+                    inventory_id, user_name, checkout_date, 
+                    expected_return_date, checkout_notes
+                )
+                OUTPUT inserted.checkout_id, inserted.checkout_date, inserted.expected_return_date
+                SELECT i.inventory_id, ?, GETDATE(), ?, ?
+                FROM dbo.Formatted_Company_Inventory i
+                WHERE i.inventory_id = ? AND i.is_loaner = 1
+                AND NOT EXISTS (
+                    SELECT 1 FROM dbo.LoanerCheckouts lc
+                    WHERE lc.inventory_id = i.inventory_id AND lc.checkin_date IS NULL
+                )
+                AND NOT EXISTS (
+                    SELECT 1 FROM dbo.LoanerReservations r WITH (UPDLOCK, HOLDLOCK)
+                    WHERE r.inventory_id = i.inventory_id AND r.status = 'active'
+                    AND r.reservation_id <> ISNULL(?, 0)
+                    AND r.start_date < ISNULL(?, '9999-12-31') AND r.end_date > GETDATE()
+                )
+            ''', (user_name, until, notes, inventory_id, reservation_id, until))
+            created = cursor.fetchone()
+        except pyodbc.IntegrityError:
+            created = False  # lost a race with another checkout
+        if not created:
+            reserved = []
+            if created is None:
+                cursor.execute('''
+                    SELECT reservation_id, start_date, end_date
+                    FROM dbo.LoanerReservations
+                    WHERE inventory_id = ? AND status = 'active' AND reservation_id <> ISNULL(?, 0)
+                    AND start_date < ISNULL(?, '9999-12-31') AND end_date > GETDATE()
+                    ORDER BY start_date
+                ''', (inventory_id, reservation_id, until))
+                reserved = cursor.fetchall()
+            rollback_db()
+            if reserved:
+                return jsonify({
+                    'error': 'Item is reserved during the requested period',
+                    'conflicts': [_booking_json((start, end, ('reservation', booking_id)))
+                                  for booking_id, start, end in reserved]
+                }), 409
             return jsonify({'error': 'Item is not available for checkout'}), 400
+        checkout_id, checkout_date, expected_return = created
+        rollups.record_checkout(cursor, inventory_id, checkout_date)
         
-        # Create checkout record
-        cursor.execute('''
-            INSERT INTO dbo.LoanerCheckouts (
-                inventory_id, user_name, checkout_date, 
-                expected_return_date, checkout_notes
-            ) VALUES (?, ?, GETDATE(), ?, ?)
-        ''', (inventory_id, user_name, expected_return_date, notes))
+        if reservation_id:
+            cursor.execute('''
+                UPDATE dbo.LoanerReservations
+                SET status = 'fulfilled'
+                WHERE reservation_id = ? AND inventory_id = ? AND status = 'active'
+            ''', (reservation_id, inventory_id))
+        
+        row = loaner_availability.row(inventory_id)
+        if row is not None:
+            asset_tag = row.get('asset_tag')
+        else:
+            cursor.execute('''
+                SELECT asset_tag FROM dbo.Formatted_Company_Inventory WHERE inventory_id = ?
+            ''', inventory_id)
+            asset_tag = cursor.fetchone()[0]
         
         # Log the change
-        log_change(
-            cursor=cursor,
-            asset_tag=None,  # We'll get this from a subquery
+        audit.record(
+            asset_tag=asset_tag,
             action_type='CHECKOUT',
             field_name='status',
             old_value='available',
@@ -85,13 +194,20 @@ def checkout_loaner():
             changed_by=user_name
         )
         
-        conn.commit()
-        return jsonify({'message': 'Checkout successful'})
+        publish('loaner.checkout', inventory_id=inventory_id, checkout_id=checkout_id,
+                asset_tag=asset_tag, user_name=user_name, checkout_date=checkout_date,
+                expected_return_date=expected_return, item=loaner_availability.row(inventory_id))
+        
+        audit.commit()
+        loaner_availability.checked_out(inventory_id)
+        reservation_schedule.book('checkout', checkout_id, inventory_id, checkout_date, expected_return)
+        if reservation_id:
+            reservation_schedule.release('reservation', reservation_id)
+        invalidate('loaners', 'audit')
+        return jsonify({'message': 'Checkout successful', 'checkout_id': checkout_id})
     except Exception as e:
+        rollback_db()
         return jsonify({'error': str(e)}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 @loaner_bp.route('/api/loaners/checkin', methods=['POST'])
 def checkin_loaner():
@@ -103,12 +219,14 @@ def checkin_loaner():
         if not checkout_id:
             return jsonify({'error': 'Missing checkout_id'}), 400
             
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        cursor = get_db().cursor()
         
-        # Get checkout info before updating
+        # Close the checkout, reading back the device and borrower in the same statement
         cursor.execute('''
-            SELECT lc.inventory_id, lc.user_name, i.asset_tag
+            UPDATE lc
+            SET checkin_date = GETDATE()
+            OUTPUT inserted.inventory_id, inserted.user_name, i.asset_tag, i.asset_type,
+                   inserted.checkout_date, inserted.checkin_date
             FROM dbo.LoanerCheckouts lc
             JOIN dbo.Formatted_Company_Inventory i ON i.inventory_id = lc.inventory_id
             WHERE lc.checkout_id = ? AND lc.checkin_date IS NULL
@@ -118,18 +236,11 @@ def checkin_loaner():
         if not result:
             return jsonify({'error': 'Invalid checkout or already checked in'}), 400
             
-        inventory_id, user_name, asset_tag = result
-        
-        # Update checkout record
-        cursor.execute('''
-            UPDATE dbo.LoanerCheckouts 
-            SET checkin_date = GETDATE()
-            WHERE checkout_id = ?
-        ''', checkout_id)
+        inventory_id, user_name, asset_tag, asset_type, checkout_date, checkin_date = result
+        rollups.record_checkin(cursor, inventory_id, checkout_date, checkin_date)
         
         # Log the change
-        log_change(
-            cursor=cursor,
+        audit.record(
             asset_tag=asset_tag,
             action_type='CHECKIN',
             field_name='status',
@@ -138,13 +249,343 @@ def checkin_loaner():
             changed_by=user_name
         )
         
-        conn.commit()
-        return jsonify({'message': 'Check-in successful'})
+        # Hand the device straight to the first person waiting for this asset type
+        assigned = _assign_waitlist(cursor, inventory_id, asset_tag, asset_type, checkout_id)
+        
+        publish('loaner.checkin', inventory_id=inventory_id, checkout_id=checkout_id,
+                asset_tag=asset_tag, item=loaner_availability.row(inventory_id))
+        if assigned:
+            publish('loaner.checkout', inventory_id=inventory_id, checkout_id=assigned['checkout_id'],
+                    asset_tag=asset_tag, user_name=assigned['user_name'],
+                    checkout_date=assigned['checkout_date'],
+                    expected_return_date=assigned['expected_return_date'],
+                    item=loaner_availability.row(inventory_id))
+        
+        audit.commit()
+        loaner_availability.checked_in(inventory_id)
+        reservation_schedule.release('checkout', checkout_id)
+        if assigned:
+            loaner_availability.checked_out(inventory_id)
+            reservation_schedule.book('checkout', assigned['checkout_id'], inventory_id,
+                                      assigned['checkout_date'], assigned['expected_return_date'])
+        invalidate('loaners', 'audit')
+        return jsonify({'message': 'Check-in successful', 'waitlist_assignment': assigned})
+    except Exception as e:
+        rollback_db()
+        return jsonify({'error': str(e)}), 500
+
+@loaner_bp.route('/api/loaners/availability')
+@conditional('loaners', 'hardware')
+def get_loaner_availability():
+    """Loaner devices free for the whole of [start, end), optionally of one asset_type"""
+    try:
+        start = _parse_datetime('start', request.args.get('start'))
+        end = _parse_datetime('end', request.args.get('end'))
+        _check_window(start, end)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        devices = reservation_schedule.free_devices(
+            get_db().cursor(), start, end, request.args.get('asset_type') or None)
+        return jsonify({'start': start.isoformat(), 'end': end.isoformat(), 'devices': devices})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@loaner_bp.route('/api/loaners/reservations')
+@conditional('loaners', 'hardware')
+def get_reservations():
+    """Active reservations that have not ended, optionally for one device"""
+    try:
+        cursor = get_db().cursor()
+        query = '''
+            SELECT r.reservation_id, r.inventory_id, i.asset_tag, i.asset_type,
+                   r.user_name, r.start_date, r.end_date, r.notes
+            FROM dbo.LoanerReservations r
+            JOIN dbo.Formatted_Company_Inventory i ON i.inventory_id = r.inventory_id
+            WHERE r.status = 'active' AND r.end_date > GETDATE()
+        '''
+        params = []
+        if request.args.get('inventory_id'):
+            query += ' AND r.inventory_id = ?'
+            params.append(int(request.args['inventory_id']))
+        cursor.execute(query + ' ORDER BY r.start_date, r.reservation_id', params)
+        return rows_response(cursor)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@loaner_bp.route('/api/loaners/reservations', methods=['POST'])
+def create_reservation():
+    """Reserve a device for a future window.
+
+    Takes user_name, start_date, end_date and either inventory_id or
+    asset_type (any free device of that type). The in-memory schedule finds
+    candidates; the INSERT re-checks overlaps in SQL so concurrent
+    reservations cannot double-book a device.
+    """
+    try:
+        data = request.get_json() or {}
+        user_name = data.get('user_name')
+        if not user_name or not (data.get('inventory_id') or data.get('asset_type')):
+            return jsonify({'error': 'Missing required fields'}), 400
+        try:
+            start = _parse_datetime('start_date', data.get('start_date'))
+            end = _parse_datetime('end_date', data.get('end_date'))
+            _check_window(start, end)
+            if start < _utc_now():
+                raise ValueError('start_date must not be in the past')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        cursor = get_db().cursor()
+        if data.get('inventory_id'):
+            inventory_id = int(data['inventory_id'])
+            conflicts = reservation_schedule.conflicts(cursor, inventory_id, start, end)
+            if conflicts:
+                return jsonify({
+                    'error': 'Item is already booked during the requested period',
+                    'conflicts': [_booking_json(booking) for booking in conflicts]
+                }), 409
+            candidates = [inventory_id]
+        else:
+            candidates = [device['inventory_id'] for device in
+                          reservation_schedule.free_devices(cursor, start, end, data['asset_type'])]
+        
+        created = None
+        for inventory_id in candidates:
+            cursor.execute('''
+                INSERT INTO dbo.LoanerReservations (inventory_id, user_name, start_date, end_date, notes)
+                OUTPUT inserted.reservation_id, inserted.inventory_id
+                SELECT i.inventory_id, ?, ?, ?, ?
+                FROM dbo.Formatted_Company_Inventory i
+                WHERE i.inventory_id = ? AND i.is_loaner = 1
+                AND NOT EXISTS (
+                    SELECT 1 FROM dbo.LoanerReservations r WITH (UPDLOCK, HOLDLOCK)
+                    WHERE r.inventory_id = i.inventory_id AND r.status = 'active'
+                    AND r.start_date < ? AND r.end_date > ?
+                )
+                AND NOT EXISTS (
+                    SELECT 1 FROM dbo.LoanerCheckouts lc
+                    WHERE lc.inventory_id = i.inventory_id AND lc.checkin_date IS NULL
+                    AND (lc.expected_return_date IS NULL OR lc.expected_return_date > ?)
+                )
+            ''', (user_name, start, end, data.get('notes'), inventory_id, end, start, start))
+            created = cursor.fetchone()
+            if created:
+                break
+        if not created:
+            rollback_db()
+            return jsonify({'error': 'No device is free during the requested period'}), 409
+        reservation_id, inventory_id = created
+        
+        device = reservation_schedule.device(cursor, inventory_id) or {}
+        audit.record(
+            asset_tag=device.get('asset_tag'),
+            action_type='RESERVE',
+            field_name='reservation',
+            old_value=None,
+            new_value=f"{start.isoformat()} - {end.isoformat()} ({user_name})",
+            changed_by=user_name
+        )
+        
+        publish('loaner.reserved', reservation_id=reservation_id, inventory_id=inventory_id,
+                user_name=user_name, start_date=start, end_date=end)
+        
+        audit.commit()
+        reservation_schedule.book('reservation', reservation_id, inventory_id, start, end)
+        invalidate('loaners', 'audit')
+        return jsonify({
+            'message': 'Reservation successful',
+            'reservation_id': reservation_id,
+            'inventory_id': inventory_id
+        })
+    except Exception as e:
+        rollback_db()
+        return jsonify({'error': str(e)}), 500
+
+@loaner_bp.route('/api/loaners/reservations/<int:reservation_id>', methods=['DELETE'])
+def cancel_reservation(reservation_id):
+    try:
+        cursor = get_db().cursor()
+        cursor.execute('''
+            UPDATE r
+            SET status = 'cancelled'
+            OUTPUT inserted.user_name, inserted.start_date, inserted.end_date, i.asset_tag
+            FROM dbo.LoanerReservations r
+            JOIN dbo.Formatted_Company_Inventory i ON i.inventory_id = r.inventory_id
+            WHERE r.reservation_id = ? AND r.status = 'active'
+        ''', reservation_id)
+        result = cursor.fetchone()
+        if not result:
+            return jsonify({'error': 'Reservation not found or not active'}), 404
+        user_name, start, end, asset_tag = result
+        
+        audit.record(
+            asset_tag=asset_tag,
+            action_type='CANCEL',
+            field_name='reservation',
+            old_value=f"{start.isoformat()} - {end.isoformat()} ({user_name})",
+            new_value=None,
+            changed_by=request.headers.get('X-User-ID', user_name)
+        )
+        
+        publish('loaner.reservation_cancelled', reservation_id=reservation_id)
+        
+        audit.commit()
+        reservation_schedule.release('reservation', reservation_id)
+        invalidate('loaners', 'audit')
+        return jsonify({'message': 'Reservation cancelled'})
+    except Exception as e:
+        rollback_db()
+        return jsonify({'error': str(e)}), 500
+
+@loaner_bp.route('/api/loaners/waitlist')
+@conditional('loaners')
+def get_waitlist():
+    """People waiting for a loaner, first in line first"""
+    try:
+        cursor = get_db().cursor()
+        query = '''
+            SELECT waitlist_id, asset_type, user_name, expected_return_date, notes, requested_at
+            FROM dbo.LoanerWaitlist
+            WHERE status = 'waiting'
+        '''
+        params = []
+        if request.args.get('asset_type'):
+            query += ' AND asset_type = ?'
+            params.append(request.args['asset_type'])
+        cursor.execute(query + ' ORDER BY asset_type, requested_at, waitlist_id', params)
+        return rows_response(cursor)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@loaner_bp.route('/api/loaners/waitlist', methods=['POST'])
+def join_waitlist():
+    """Wait for the next device of an asset_type; it is checked out to you on checkin"""
+    try:
+        data = request.get_json() or {}
+        if not data.get('asset_type') or not data.get('user_name'):
+            return jsonify({'error': 'Missing required fields'}), 400
+        try:
+            expected_return_date = (_parse_datetime('expected_return_date', data['expected_return_date'])
+                                    if data.get('expected_return_date') else None)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        cursor = get_db().cursor()
+        cursor.execute('''
+            INSERT INTO dbo.LoanerWaitlist (asset_type, user_name, expected_return_date, notes)
+            OUTPUT inserted.waitlist_id
+            VALUES (?, ?, ?, ?)
+        ''', (data['asset_type'], data['user_name'], expected_return_date, data.get('notes')))
+        waitlist_id = cursor.fetchone()[0]
+        get_db().commit()
+        invalidate('loaners')
+        return jsonify({'message': 'Added to waitlist', 'waitlist_id': waitlist_id})
     except Exception as e:
+        rollback_db()
         return jsonify({'error': str(e)}), 500
-    finally:
-        cursor.close()
-        conn.close()
+
+@loaner_bp.route('/api/loaners/waitlist/<int:waitlist_id>', methods=['DELETE'])
+def leave_waitlist(waitlist_id):
+    try:
+        cursor = get_db().cursor()
+        cursor.execute('''
+            UPDATE dbo.LoanerWaitlist
+            SET status = 'cancelled'
+            WHERE waitlist_id = ? AND status = 'waiting'
+        ''', waitlist_id)
+        if cursor.rowcount == 0:
+            return jsonify({'error': 'Waitlist entry not found or no longer waiting'}), 404
+        get_db().commit()
+        invalidate('loaners')
+        return jsonify({'message': 'Removed from waitlist'})
+    except Exception as e:
+        rollback_db()
+        return jsonify({'error': str(e)}), 500
+
+def _assign_waitlist(cursor, inventory_id, asset_tag, asset_type, returned_checkout_id):
+    """Check the device out to the longest-waiting person whose loan it can cover.
+
+    Runs inside the checkin transaction. Entries whose loan period would run
+    into a reservation are passed over. Returns the new checkout, or None.
+    """
+    # UPDLOCK holds the candidates until commit; READPAST skips rows another checkin is assigning
+    cursor.execute('''
+        SELECT TOP (20) waitlist_id, user_name, expected_return_date, notes
+        FROM dbo.LoanerWaitlist WITH (UPDLOCK, READPAST, ROWLOCK)
+        WHERE asset_type = ? AND status = 'waiting'
+        ORDER BY requested_at, waitlist_id
+    ''', asset_type)
+    waiting = cursor.fetchall()
+    
+    now = _utc_now()
+    for waitlist_id, user_name, expected_return_date, notes in waiting:
+        until = expected_return_date or now + timedelta(days=config.LOANER_DEFAULT_LOAN_DAYS)
+        if reservation_schedule.conflicts(cursor, inventory_id, now, until, ('checkout', returned_checkout_id)):
+            continue
+        
+        cursor.execute('''
+            INSERT INTO dbo.LoanerCheckouts (
+                inventory_id, user_name, checkout_date,
+                expected_return_date, checkout_notes
+            )
+            OUTPUT inserted.checkout_id, inserted.checkout_date
+            VALUES (?, ?, GETDATE(), ?, ?)
+        ''', (inventory_id, user_name, expected_return_date, notes))
+        checkout_id, checkout_date = cursor.fetchone()
+        rollups.record_checkout(cursor, inventory_id, checkout_date)
+        cursor.execute('''
+            UPDATE dbo.LoanerWaitlist
+            SET status = 'assigned', assigned_checkout_id = ?, assigned_at = GETDATE()
+            WHERE waitlist_id = ?
+        ''', (checkout_id, waitlist_id))
+        
+        audit.record(
+            asset_tag=asset_tag,
+            action_type='CHECKOUT',
+            field_name='status',
+            old_value='available',
+            new_value='checked out (waitlist)',
+            changed_by=user_name
+        )
+        return {
+            'waitlist_id': waitlist_id,
+            'checkout_id': checkout_id,
+            'user_name': user_name,
+            'checkout_date': checkout_date,
+            'expected_return_date': expected_return_date
+        }
+    return None
+
+def _parse_datetime(name, raw):
+    if not raw:
+        raise ValueError(f'Missing {name}')
+    try:
+        value = datetime.fromisoformat(raw)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an ISO date or datetime')
+    # Stored and compared as naive UTC (the database clock); a "Z" or offset is converted
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _utc_now():
+    # Naive UTC, like GETDATE() on Azure SQL and the values _parse_datetime returns
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _check_window(start, end):
+    if end <= start:
+        raise ValueError('end must be after start')
+
+def _booking_json(booking):
+    start, end, (kind, booking_id) = booking
+    return {
+        'type': kind,
+        'id': booking_id,
+        'start': start.isoformat(),
+        'end': None if end == datetime.max else end.isoformat()
+    }
 
 @loaner_bp.route('/loaners')
 def loaner_management():
@@ -1,12 +1,22 @@
-from flask import Blueprint, request, jsonify, g
-from utils import log_change
+import json
+import pyodbc
+from flask import Blueprint, request, jsonify
+import audit
+from db_pool import get_db, rollback_db
+from cache import invalidate
+from search import inventory_index
+import suggest
+from events import publish
 
 bp = Blueprint('locations', __name__)
 
+LOCATION_FIELDS = ['site_name', 'room_number', 'room_name', 'room_type']
+MAX_BATCH_OPERATIONS = 1000
+
 @bp.route('/api/locations', methods=['POST'])
 def create_location():
     try:
-        data = request.get_json()
+        data = _stripped(request.get_json())
         required_fields = ['site_name', 'room_number', 'room_name', 'room_type']
         
         # Validate required fields
@@ -14,34 +24,34 @@ def create_location():
             if not data.get(field):
                 return jsonify({'error': f'Missing required field: {field}'}), 400
 
-        cursor = g.db.cursor()
-        
-        # Check if location already exists
-        cursor.execute("""
-            SELECT location_id FROM dbo.Locations 
-            WHERE site_name = ? AND room_number = ?
-        """, (data['site_name'], data['room_number']))
+        cursor = get_db().cursor()
         
-        if cursor.fetchone():
-            return jsonify({'error': 'Location already exists'}), 409
-
-        # Insert new location
+        # Insert new location unless (site_name, room_number) is taken, in one statement
         cursor.execute("""
             INSERT INTO dbo.Locations (site_name, room_number, room_name, room_type)
-            VALUES (?, ?, ?, ?);
-            SELECT SCOPE_IDENTITY() as location_id;
+            OUTPUT inserted.location_id
+            SELECT ?, ?, ?, ?
+            WHERE NOT EXISTS (
+                SELECT 1 FROM dbo.Locations WITH (UPDLOCK, HOLDLOCK)
+                WHERE site_name = ? AND room_number = ?
+            )
         """, (
             data['site_name'],
             data['room_number'],
             data['room_name'],
-            data['room_type']
+            data['room_type'],
+            data['site_name'],
+            data['room_number']
         ))
         
-        location_id = cursor.fetchone()[0]
+        created = cursor.fetchone()
+        if not created:
+            rollback_db()
+            return jsonify({'error': 'Location already exists'}), 409
+        location_id = created[0]
 
         # Log the creation
-        log_change(
-            cursor=cursor,
+        audit.record(
             asset_tag=f"LOC_{location_id}",  # Use location_id as reference
             action_type='CREATE',
             field_name='location',
@@ -50,7 +60,13 @@ def create_location():
             changed_by=request.headers.get('X-User-ID', 'system')
         )
         
-        g.db.commit()
+        publish('location.created', location_id=location_id,
+                **{field: data[field] for field in LOCATION_FIELDS})
+        
+        audit.commit()
+        invalidate('locations', 'audit')
+        suggest.record('site_name', None, data['site_name'])
+        suggest.record('room_number', None, data['room_number'])
         
         return jsonify({
             'success': True,
@@ -59,74 +75,58 @@ def create_location():
         })
         
     except Exception as e:
-        g.db.rollback()
+        rollback_db()
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/api/locations/<int:location_id>', methods=['PUT'])
 def update_location(location_id):
     try:
-        data = request.get_json()
-        cursor = g.db.cursor()
+        data = _stripped(request.get_json())
         
-        # Check if location exists
-        cursor.execute("SELECT * FROM dbo.Locations WHERE location_id = ?", (location_id,))
-        location = cursor.fetchone()
-        if not location:
-            return jsonify({'error': 'Location not found'}), 404
-
         # Build update query dynamically based on provided fields
-        update_fields = []
-        params = []
-        
-        if 'site_name' in data:
-            update_fields.append("site_name = ?")
-            params.append(data['site_name'])
-        
-        if 'room_number' in data:
-            update_fields.append("room_number = ?")
-            params.append(data['room_number'])
-        
-        if 'room_name' in data:
-            update_fields.append("room_name = ?")
-            params.append(data['room_name'])
-        
-        if 'room_type' in data:
-            update_fields.append("room_type = ?")
-            params.append(data['room_type'])
-            
-        if not update_fields:
+        fields = [field for field in LOCATION_FIELDS if field in data]
+        if not fields:
             return jsonify({'error': 'No fields to update'}), 400
-            
-        # Add location_id to params
-        params.append(location_id)
-        
-        # Get old values for logging
-        old_values = dict(zip(
-            ['site_name', 'room_number', 'room_name', 'room_type'],
-            location
-        ))
-
-        # Execute update
+        for field in fields:
+            if not data[field]:
+                return jsonify({'error': f'{field} must be a non-empty string'}), 400
+        
+        cursor = get_db().cursor()
+        
+        # Update and read back the old and new values in one statement
         cursor.execute(f"""
             UPDATE dbo.Locations 
-            SET {', '.join(update_fields)}
+            SET {', '.join(f'{field} = ?' for field in fields)}
+            OUTPUT {', '.join(f'deleted.{field}' for field in LOCATION_FIELDS)},
+                   {', '.join(f'inserted.{field}' for field in LOCATION_FIELDS)}
             WHERE location_id = ?
-        """, params)
-
+        """, [data[field] for field in fields] + [location_id])
+        row = cursor.fetchone()
+        if not row:
+            return jsonify({'error': 'Location not found'}), 404
+        old_values = dict(zip(LOCATION_FIELDS, row[:len(LOCATION_FIELDS)]))
+        new_values = dict(zip(LOCATION_FIELDS, row[len(LOCATION_FIELDS):]))
+        
         # Log each changed field
-        for field in ['site_name', 'room_number', 'room_name', 'room_type']:
-            if field in data and data[field] != old_values[field]:
-                log_change(
-                    cursor=cursor,
+        changed_by = request.headers.get('X-User-ID', 'system')
+        for field in fields:
+            if new_values[field] != old_values[field]:
+                audit.record(
                     asset_tag=f"LOC_{location_id}",
                     action_type='UPDATE',
                     field_name=field,
                     old_value=old_values[field],
-                    new_value=data[field],
-                    changed_by=request.headers.get('X-User-ID', 'system')
+                    new_value=new_values[field],
+                    changed_by=changed_by
                 )
+        publish('location.updated', location_id=location_id, **new_values)
         
-        g.db.commit()
+        audit.commit()
+        invalidate('locations', 'audit')
+        inventory_index.update_location(location_id, {field: new_values[field] for field in fields})
+        for field in ['site_name', 'room_number']:
+            if field in data:
+                suggest.record(field, old_values[field], new_values[field])
         
         return jsonify({
             'success': True,
@@ -134,45 +134,38 @@ def update_location(location_id):
         })
         
     except Exception as e:
-        g.db.rollback()
+        rollback_db()
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/api/locations/<int:location_id>', methods=['DELETE'])
 def delete_location(location_id):
     try:
-        cursor = g.db.cursor()
+        cursor = get_db().cursor()
         
-        # Check if location exists
-        cursor.execute("SELECT * FROM dbo.Locations WHERE location_id = ?", (location_id,))
-        if not cursor.fetchone():
-            return jsonify({'error': 'Location not found'}), 404
-            
-        # Check if location is in use
+        # Delete the location unless inventory items are assigned to it,
+        # returning what was deleted for the audit log
         cursor.execute("""
-            SELECT COUNT(*) as count 
-            FROM dbo.Formatted_Company_Inventory 
+            DELETE FROM dbo.Locations
+            OUTPUT deleted.site_name, deleted.room_number
             WHERE location_id = ?
-        """, (location_id,))
+            AND NOT EXISTS (
+                SELECT 1 FROM dbo.Formatted_Company_Inventory
+                WHERE location_id = ?
+            )
+        """, (location_id, location_id))
+        location = cursor.fetchone()
         
-        if cursor.fetchone()[0] > 0:
+        if not location:
+            # Nothing deleted: only now find out which check failed
+            cursor.execute("SELECT 1 FROM dbo.Locations WHERE location_id = ?", (location_id,))
+            if not cursor.fetchone():
+                return jsonify({'error': 'Location not found'}), 404
             return jsonify({
                 'error': 'Cannot delete location that has inventory items assigned to it'
             }), 400
-            
-        # Get location details for logging
-        cursor.execute("""
-            SELECT site_name, room_number
-            FROM dbo.Locations 
-            WHERE location_id = ?
-        """, (location_id,))
-        location = cursor.fetchone()
-        
-        # Delete location
-        cursor.execute("DELETE FROM dbo.Locations WHERE location_id = ?", (location_id,))
 
         # Log the deletion
-        log_change(
-            cursor=cursor,
+        audit.record(
             asset_tag=f"LOC_{location_id}",
             action_type='DELETE',
             field_name='location',
@@ -181,7 +174,12 @@ def delete_location(location_id):
             changed_by=request.headers.get('X-User-ID', 'system')
         )
         
-        g.db.commit()
+        publish('location.deleted', location_id=location_id)
+        
+        audit.commit()
+        invalidate('locations', 'audit')
+        suggest.record('site_name', location[0], None)
+        suggest.record('room_number', location[1], None)
         
         return jsonify({
             'success': True,
@@ -189,14 +187,14 @@ def delete_location(location_id):
         })
         
     except Exception as e:
-        g.db.rollback()
+        rollback_db()
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/api/locations/validate', methods=['POST'])
 def validate_location():
     try:
         data = request.get_json()
-        cursor = g.db.cursor()
+        cursor = get_db().cursor()
         
         # Check if site_name and room_number combination exists
         cursor.execute("""
@@ -214,3 +212,285 @@ def validate_location():
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/locations/batch', methods=['POST'])
+def batch_locations():
+    """Apply many location creates, updates and deletes in one transaction.
+
+    Takes {"operations": [{"op": "create", <fields>}, {"op": "update",
+    "location_id": ..., <fields>}, {"op": "delete", "location_id": ...}]}.
+    Every location involved is read in one query, each operation is checked
+    against (site_name, room_number) uniqueness in memory, and the valid ones
+    are applied with one DELETE and one MERGE; audit.commit() writes all
+    their audit rows at once.
+    Invalid operations are skipped and reported in `results`, in input order.
+    If a concurrent write makes the DELETE or MERGE violate a constraint, the
+    whole batch is rolled back and a 409 lists the operations that clash.
+    """
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'error': f'At most {MAX_BATCH_OPERATIONS} operations per request'}), 400
+
+    results = [_check_operation(index, op) for index, op in enumerate(operations)]
+
+    try:
+        cursor = get_db().cursor()
+        existing = _load_batch_locations(cursor, operations, results)
+        deletes, upserts = _plan_batch(operations, results, existing)
+
+        changed_by = request.headers.get('X-User-ID', 'system')
+
+        if deletes:
+            cursor.execute("""
+                DELETE FROM dbo.Locations
+                OUTPUT deleted.location_id, deleted.site_name, deleted.room_number
+                WHERE location_id IN (SELECT value FROM OPENJSON(?))
+            """, json.dumps([existing_id for existing_id, _ in deletes]))
+            deleted = {row[0]: row for row in cursor.fetchall()}
+            for location_id, index in deletes:
+                row = deleted.get(location_id)
+                if row is None:
+                    results[index].update(status='not_found', error='Location not found')
+                    continue
+                results[index]['status'] = 'deleted'
+                audit.record(f"LOC_{location_id}", 'DELETE', 'location',
+                             f"{row[1]} - {row[2]}", None, changed_by)
+                publish('location.deleted', location_id=location_id)
+
+        if upserts:
+            # location_id is NULL for creates, so they fall through to INSERT;
+            # OUTPUT ties each row back to its operation through `item`
+            cursor.execute("""
+                MERGE dbo.Locations AS target
+                USING (
+                    SELECT item, location_id, site_name, room_number, room_name, room_type
+                    FROM OPENJSON(?) WITH (
+                        item INT,
+                        location_id INT,
+                        site_name NVARCHAR(100),
+                        room_number NVARCHAR(50),
+                        room_name NVARCHAR(100),
+                        room_type NVARCHAR(50)
+                    )
+                ) AS source
+                ON target.location_id = source.location_id
+                WHEN MATCHED THEN UPDATE SET
+                    site_name = source.site_name,
+                    room_number = source.room_number,
+                    room_name = source.room_name,
+                    room_type = source.room_type
+                WHEN NOT MATCHED BY TARGET AND source.location_id IS NULL THEN
+                    INSERT (site_name, room_number, room_name, room_type)
+                    VALUES (source.site_name, source.room_number, source.room_name, source.room_type)
+                OUTPUT $action, source.item, inserted.location_id;
+            """, json.dumps([values for values, _ in upserts]))
+            merged = {row[1]: (row[0], row[2]) for row in cursor.fetchall()}
+            for values, old in upserts:
+                index = values['item']
+                if index not in merged:
+                    results[index].update(status='not_found', error='Location not found')
+                    continue
+                action, location_id = merged[index]
+                results[index]['location_id'] = location_id
+                if action == 'INSERT':
+                    results[index]['status'] = 'created'
+                    audit.record(f"LOC_{location_id}", 'CREATE', 'location', None,
+                                 f"{values['site_name']} - {values['room_number']}", changed_by)
+                    publish('location.created', location_id=location_id,
+                            **{field: values[field] for field in LOCATION_FIELDS})
+                else:
+                    results[index]['status'] = 'updated'
+                    for field in LOCATION_FIELDS:
+                        if values[field] != old[field]:
+                            audit.record(f"LOC_{location_id}", 'UPDATE', field,
+                                         old[field], values[field], changed_by)
+                    publish('location.updated', location_id=location_id,
+                            **{field: values[field] for field in LOCATION_FIELDS})
+
+        audit.commit()
+
+        if deletes or upserts:
+            invalidate('locations', 'audit')
+        _apply_batch_to_indexes(results, deletes, upserts, existing)
+
+        return jsonify({
+            'success': all(result['status'] not in ('error', 'conflict', 'not_found') for result in results),
+            'results': results
+        })
+
+    except pyodbc.IntegrityError as e:
+        # A concurrent writer took a key, or gave a location to be deleted
+        # items, after the plan was read. Nothing was applied; plan again
+        # against the current rows to report which operations now clash.
+        rollback_db()
+        return _batch_conflict(operations, str(e))
+    except Exception as e:
+        rollback_db()
+        return jsonify({'error': str(e)}), 500
+
+def _batch_conflict(operations, message):
+    try:
+        results = [_check_operation(index, op) for index, op in enumerate(operations)]
+        existing = _load_batch_locations(get_db().cursor(), operations, results)
+        _plan_batch(operations, results, existing)
+        rollback_db()
+    except Exception as e:
+        rollback_db()
+        return jsonify({'error': str(e)}), 500
+    for result in results:
+        if result['status'] == 'pending':
+            result['status'] = 'not_applied'
+    return jsonify({
+        'success': False,
+        'error': 'The batch conflicts with a concurrent change and was not applied',
+        'detail': message,
+        'conflicts': [result for result in results if result['status'] in ('conflict', 'not_found', 'error')],
+        'results': results
+    }), 409
+
+def _stripped(data):
+    """Request fields with surrounding whitespace removed, as the batch endpoint stores them"""
+    return {field: value.strip() if isinstance(value, str) else value for field, value in (data or {}).items()}
+
+def _check_operation(index, op):
+    """Validate one operation's shape; returns its result entry (status 'error' if invalid)"""
+    result = {'index': index, 'op': op.get('op') if isinstance(op, dict) else None, 'status': 'pending'}
+    if not isinstance(op, dict) or op.get('op') not in ('create', 'update', 'delete'):
+        return dict(result, status='error', error='op must be create, update or delete')
+    if op['op'] == 'create':
+        for field in LOCATION_FIELDS:
+            if not isinstance(op.get(field), str) or not op[field].strip():
+                return dict(result, status='error', error=f'Missing required field: {field}')
+        return result
+    if not isinstance(op.get('location_id'), int) or isinstance(op['location_id'], bool):
+        return dict(result, status='error', error='location_id must be an integer')
+    result['location_id'] = op['location_id']
+    if op['op'] == 'update':
+        fields = [field for field in LOCATION_FIELDS if field in op]
+        if not fields:
+            return dict(result, status='error', error='No fields to update')
+        for field in fields:
+            if not isinstance(op[field], str) or not op[field].strip():
+                return dict(result, status='error', error=f'{field} must be a non-empty string')
+    return result
+
+def _load_batch_locations(cursor, operations, results):
+    """Read every location the batch names by id or by (site_name, room_number), in one query"""
+    ids = []
+    keys = []
+    for op, result in zip(operations, results):
+        if result['status'] == 'error':
+            continue
+        if 'location_id' in result:
+            ids.append(op['location_id'])
+        if op['op'] != 'delete':
+            keys.append({
+                'location_id': result.get('location_id'),
+                'site_name': op.get('site_name'),
+                'room_number': op.get('room_number')
+            })
+
+    # An update may change only one half of the key; the other half comes
+    # from the row being updated
+    cursor.execute("""
+        SELECT
+            l.location_id, l.site_name, l.room_number, l.room_name, l.room_type,
+            (SELECT COUNT(*) FROM dbo.Formatted_Company_Inventory i WHERE i.location_id = l.location_id)
+        FROM dbo.Locations l
+        WHERE l.location_id IN (SELECT value FROM OPENJSON(?))
+        OR EXISTS (
+            SELECT 1
+            FROM OPENJSON(?) WITH (
+                location_id INT,
+                site_name NVARCHAR(100),
+                room_number NVARCHAR(50)
+            ) k
+            LEFT JOIN dbo.Locations current_row ON current_row.location_id = k.location_id
+            WHERE l.site_name = COALESCE(k.site_name, current_row.site_name)
+            AND l.room_number = COALESCE(k.room_number, current_row.room_number)
+        )
+    """, json.dumps(ids), json.dumps(keys))
+    existing = {}
+    for row in cursor.fetchall():
+        location = dict(zip(['location_id'] + LOCATION_FIELDS + ['item_count'], row))
+        existing[location['location_id']] = location
+    return existing
+
+def _location_key(site_name, room_number):
+    # Same equality as the UQ_Location constraint under the default collation
+    return (site_name.strip().casefold(), room_number.strip().casefold())
+
+def _plan_batch(operations, results, existing):
+    """Check each operation against the batch's final state of (site_name, room_number) keys.
+
+    Deletes are applied first, then creates and updates in order, so a key
+    freed by a delete can be reused in the same batch. Returns the valid
+    deletes as [(location_id, index)] and the creates/updates as
+    [(row for the MERGE, previous values or None)].
+    """
+    taken = {_location_key(loc['site_name'], loc['room_number']): location_id
+             for location_id, loc in existing.items()}
+    seen_ids = set()
+    deletes = []
+    upserts = []
+
+    for index, op in enumerate(operations):
+        result = results[index]
+        if result['status'] != 'pending' or op['op'] == 'create':
+            continue
+        location_id = op['location_id']
+        if location_id in seen_ids:
+            result.update(status='error', error='location_id appears more than once in the batch')
+        elif location_id not in existing:
+            result.update(status='not_found', error='Location not found')
+        elif op['op'] == 'delete' and existing[location_id]['item_count'] > 0:
+            result.update(status='error', error='Cannot delete location that has inventory items assigned to it')
+        seen_ids.add(location_id)
+        if result['status'] == 'pending' and op['op'] == 'delete':
+            location = existing[location_id]
+            del taken[_location_key(location['site_name'], location['room_number'])]
+            deletes.append((location_id, index))
+
+    for index, op in enumerate(operations):
+        result = results[index]
+        if result['status'] != 'pending' or op['op'] == 'delete':
+            continue
+        location_id = result.get('location_id')  # None for creates
+        old = existing.get(location_id)
+        values = {field: (op[field].strip() if field in op else old[field]) for field in LOCATION_FIELDS}
+        key = _location_key(values['site_name'], values['room_number'])
+        holder = taken.get(key)
+        if holder is not None and holder != location_id:
+            result.update(status='conflict', error='Location already exists', conflicting_location_id=holder)
+            continue
+        if old is not None:
+            if all(values[field] == old[field] for field in LOCATION_FIELDS):
+                result['status'] = 'unchanged'
+                continue
+            del taken[_location_key(old['site_name'], old['room_number'])]
+        taken[key] = location_id if location_id is not None else -1 - index  # placeholder for new rows
+        upserts.append((dict(values, item=index, location_id=location_id), old))
+
+    return deletes, upserts
+
+def _apply_batch_to_indexes(results, deletes, upserts, existing):
+    """Carry committed batch changes into the search index and typeahead tries"""
+    for location_id, index in deletes:
+        if results[index]['status'] == 'deleted':
+            location = existing[location_id]
+            suggest.record('site_name', location['site_name'], None)
+            suggest.record('room_number', location['room_number'], None)
+    for values, old in upserts:
+        status = results[values['item']]['status']
+        if status == 'created':
+            suggest.record('site_name', None, values['site_name'])
+            suggest.record('room_number', None, values['room_number'])
+        elif status == 'updated':
+            inventory_index.update_location(old['location_id'], {
+                field: values[field] for field in LOCATION_FIELDS
+            })
+            suggest.record('site_name', old['site_name'], values['site_name'])
+            suggest.record('room_number', old['room_number'], values['room_number'])
@@ -0,0 +1,279 @@
+"""Loaner reservation schedule.
+
+Every loaner device has an IntervalTree of the periods it is booked for:
+active reservations (dbo.LoanerReservations) and open checkouts, which
+run from checkout_date to expected_return_date (or indefinitely). A
+conflict check for one device costs O(log n + k) in its bookings, and
+finding the free devices for a window costs one such check per device,
+so neither grows with the total number of bookings.
+
+The schedule is loaded once and then kept current by the reservation,
+checkout and checkin routes; like the availability index it is cleared
+by inventory writes and reloads every LOANER_AVAILABILITY_TTL seconds.
+"""
+import random
+import threading
+import time
+from datetime import datetime
+
+import config
+from cache import register
+
+FOREVER = datetime.max
+
+SCHEDULE_QUERIES = {
+    'devices': """
+        SELECT inventory_id, asset_tag, asset_type
+        FROM dbo.Formatted_Company_Inventory
+        WHERE is_loaner = 1
+    """,
+    'reservations': """
+        SELECT reservation_id, inventory_id, start_date, end_date
+        FROM dbo.LoanerReservations
+        WHERE status = 'active' AND end_date > GETDATE()
+    """,
+    'checkouts': """
+        SELECT checkout_id, inventory_id, checkout_date, expected_return_date
+        FROM dbo.LoanerCheckouts
+        WHERE checkin_date IS NULL
+    """,
+}
+
+
+class _Node:
+    __slots__ = ('interval', 'priority', 'max_end', 'left', 'right')
+
+    def __init__(self, interval):
+        self.interval = interval  # (start, end, key)
+        self.priority = random.random()
+        self.max_end = interval[1]
+        self.left = None
+        self.right = None
+
+
+class IntervalTree:
+    """Half-open intervals [start, end) tagged with a key.
+
+    A treap ordered by (start, end, key) in which every node also stores
+    the latest end in its subtree, so a search can skip any subtree that
+    ends before the window starts. Inserts and removals are O(log n)
+    expected; finding the k intervals that overlap a window is O(log n + k).
+    """
+
+    def __init__(self):
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def insert(self, start, end, key):
+        left, right = _split(self._root, (start, end, key))
+        self._root = _merge(_merge(left, _Node((start, end, key))), right)
+        self._size += 1
+
+    def remove(self, start, end, key):
+        """Remove one interval; returns False if it was not in the tree"""
+        self._root, removed = _remove(self._root, (start, end, key))
+        if removed:
+            self._size -= 1
+        return removed
+
+    def overlapping(self, start, end):
+        """Every (start, end, key) that overlaps [start, end), in start order"""
+        found = []
+        _collect(self._root, start, end, found)
+        return found
+
+    def overlaps(self, start, end):
+        return _any(self._root, start, end)
+
+
+def _update(node):
+    node.max_end = node.interval[1]
+    for child in (node.left, node.right):
+        if child is not None and child.max_end > node.max_end:
+            node.max_end = child.max_end
+
+
+def _split(node, interval):
+    """Split into (intervals < interval, intervals >= interval)"""
+    if node is None:
+        return None, None
+    if node.interval < interval:
+        node.right, right = _split(node.right, interval)
+        _update(node)
+        return node, right
+    left, node.left = _split(node.left, interval)
+    _update(node)
+    return left, node
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+def _remove(node, interval):
+    if node is None:
+        return None, False
+    if node.interval == interval:
+        return _merge(node.left, node.right), True
+    if interval < node.interval:
+        node.left, removed = _remove(node.left, interval)
+    else:
+        node.right, removed = _remove(node.right, interval)
+    if removed:
+        _update(node)
+    return node, removed
+
+
+def _collect(node, start, end, found):
+    if node is None or node.max_end <= start:
+        return
+    _collect(node.left, start, end, found)
+    if node.interval[0] < end:
+        if node.interval[1] > start:
+            found.append(node.interval)
+        _collect(node.right, start, end, found)
+
+
+def _any(node, start, end):
+    while node is not None and node.max_end > start:
+        if node.left is not None and node.left.max_end > start:
+            if _any(node.left, start, end):
+                return True
+        if node.interval[0] >= end:
+            return False  # this node and everything to its right start too late
+        if node.interval[1] > start:
+            return True
+        node = node.right
+    return False
+
+
+class ReservationSchedule:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._devices = {}   # inventory_id -> {'asset_tag', 'asset_type'}
+        self._bookings = {}  # inventory_id -> IntervalTree
+        self._keys = {}      # (kind, id) -> (inventory_id, start, end)
+        self._loaded_at = None
+        self._replay = None
+        self._cleared = 0
+
+    def free_devices(self, cursor, start, end, asset_type=None):
+        """Loaner devices (optionally of one asset_type) with no booking overlapping [start, end)"""
+        self._ensure_loaded(cursor)
+        with self._lock:
+            return [
+                dict(device, inventory_id=inventory_id)
+                for inventory_id, device in sorted(self._devices.items())
+                if (asset_type is None or device['asset_type'] == asset_type)
+                and not self._bookings[inventory_id].overlaps(start, end)
+            ]
+
+    def conflicts(self, cursor, inventory_id, start, end, ignore=None):
+        """Bookings of one device overlapping [start, end), as [(start, end, (kind, id))]"""
+        self._ensure_loaded(cursor)
+        with self._lock:
+            tree = self._bookings.get(inventory_id)
+            if tree is None:
+                return []
+            return [booking for booking in tree.overlapping(start, end) if booking[2] != ignore]
+
+    def device(self, cursor, inventory_id):
+        self._ensure_loaded(cursor)
+        with self._lock:
+            return self._devices.get(inventory_id)
+
+    def book(self, kind, booking_id, inventory_id, start, end):
+        """Record a reservation or checkout made by a committed transaction"""
+        def change():
+            self._unbook((kind, booking_id))
+            tree = self._bookings.get(inventory_id)
+            if tree is not None:
+                tree.insert(start, end or FOREVER, (kind, booking_id))
+                self._keys[(kind, booking_id)] = (inventory_id, start, end or FOREVER)
+        self._apply(change)
+
+    def release(self, kind, booking_id):
+        """Forget a cancelled reservation or a checked-in checkout"""
+        self._apply(lambda: self._unbook((kind, booking_id)))
+
+    def clear(self):
+        with self._lock:
+            self._loaded_at = None
+            self._cleared += 1
+
+    def load(self, cursor):
+        with self._lock:
+            cleared = self._cleared
+            self._replay = []
+        try:
+            rows = {}
+            for name, query in SCHEDULE_QUERIES.items():
+                cursor.execute(query)
+                rows[name] = cursor.fetchall()
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+
+        devices = {
+            inventory_id: {'asset_tag': asset_tag, 'asset_type': asset_type}
+            for inventory_id, asset_tag, asset_type in rows['devices']
+        }
+        bookings = {inventory_id: IntervalTree() for inventory_id in devices}
+        keys = {}
+        for kind, name in (('reservation', 'reservations'), ('checkout', 'checkouts')):
+            for booking_id, inventory_id, start, end in rows[name]:
+                if inventory_id in bookings:
+                    bookings[inventory_id].insert(start, end or FOREVER, (kind, booking_id))
+                    keys[(kind, booking_id)] = (inventory_id, start, end or FOREVER)
+
+        with self._lock:
+            replay, self._replay = self._replay, None
+            self._devices = devices
+            self._bookings = bookings
+            self._keys = keys
+            # The load may have read from before these changes committed
+            for change in replay:
+                change()
+            self._loaded_at = time.monotonic() if cleared == self._cleared else None
+
+    def _unbook(self, key):
+        booked = self._keys.pop(key, None)
+        if booked is not None:
+            inventory_id, start, end = booked
+            self._bookings[inventory_id].remove(start, end, key)
+
+    def _ensure_loaded(self, cursor):
+        if self._is_current():
+            return
+        with self._load_lock:
+            if not self._is_current():
+                self.load(cursor)
+
+    def _is_current(self):
+        with self._lock:
+            return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def _apply(self, change):
+        with self._lock:
+            change()
+            if self._replay is not None:
+                self._replay.append(change)
+
+
+reservation_schedule = register(ReservationSchedule(config.LOANER_AVAILABILITY_TTL), 'hardware')
@@ -0,0 +1,316 @@
+"""In-memory full-text search over the inventory.
+
+InventoryIndex keeps a tokenized inverted index (token -> {inventory_id:
+weight}) over the searchable text columns of every inventory row, plus a
+copy of each row so results can be returned without touching SQL Server.
+The index is loaded once from dbo.Formatted_Company_Inventory and then
+kept current by the write paths calling update_fields() / update_location().
+A periodic rebuild (SEARCH_INDEX_TTL) picks up writes made elsewhere.
+"""
+import heapq
+import math
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+import config
+from db_pool import get_pool
+
+# Relative importance of a match in each column
+FIELD_WEIGHTS = {
+    'asset_tag': 5.0,
+    'serial_number': 5.0,
+    'model': 3.0,
+    'assigned_to': 3.0,
+    'asset_type': 2.0,
+    'site_name': 1.5,
+    'room_number': 1.5,
+    'room_name': 1.5,
+    'notes': 1.0,
+}
+
+# Identifier-like columns are also indexed as one token with separators removed,
+# so "MWG-00123", "mwg00123" and "00123" all find the same asset
+IDENTIFIER_FIELDS = ('asset_tag', 'serial_number')
+
+DOCUMENT_QUERY = """
+    SELECT
+        i.inventory_id,
+        i.location_id,
+        l.site_name,
+        l.room_number,
+        l.room_name,
+        l.room_type,
+        i.asset_tag,
+        i.asset_type,
+        i.model,
+        i.serial_number,
+        i.notes,
+        i.assigned_to,
+        i.date_assigned,
+        i.date_decommissioned,
+        i.is_loaner
+    FROM dbo.Formatted_Company_Inventory i
+    LEFT JOIN dbo.Locations l ON i.location_id = l.location_id
+"""
+
+_TOKEN_RE = re.compile(r'[0-9a-z]+')
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+def document_tokens(doc):
+    """Map each token in a document to its weight (the best field it occurs in)"""
+    tokens = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        value = doc.get(field)
+        if value is None:
+            continue
+        field_tokens = tokenize(value)
+        if field in IDENTIFIER_FIELDS and len(field_tokens) > 1:
+            field_tokens.append(''.join(field_tokens))
+        for token in field_tokens:
+            if tokens.get(token, 0) < weight:
+                tokens[token] = weight
+    return tokens
+
+
+class InventoryIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = {}        # inventory_id -> row dict
+        self._doc_tokens = {}  # inventory_id -> {token: weight}
+        self._postings = {}    # token -> {inventory_id: weight}
+        self._vocabulary = []  # sorted tokens, for prefix lookups
+        self._replay = None    # changes made while a rebuild is reading, re-applied after it
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    def build(self, cursor):
+        """Replace the whole index with the current inventory"""
+        with self._lock:
+            self._replay = []
+        try:
+            docs, doc_tokens, postings = self._load(cursor)
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+
+        with self._lock:
+            replay, self._replay = self._replay, None
+            self._docs = docs
+            self._doc_tokens = doc_tokens
+            self._postings = postings
+            self._vocabulary = sorted(postings)
+            self.built_at = time.monotonic()
+            # The build may have read rows from before these changes committed
+            for change in replay:
+                change()
+
+    def _load(self, cursor):
+        cursor.execute(DOCUMENT_QUERY)
+        columns = [column[0] for column in cursor.description]
+        docs = {}
+        doc_tokens = {}
+        postings = {}
+        for row in cursor.fetchall():
+            doc = dict(zip(columns, row))
+            inventory_id = doc['inventory_id']
+            tokens = document_tokens(doc)
+            docs[inventory_id] = doc
+            doc_tokens[inventory_id] = tokens
+            for token, weight in tokens.items():
+                postings.setdefault(token, {})[inventory_id] = weight
+        return docs, doc_tokens, postings
+
+    def update_location(self, location_id, values):
+        """Apply changed location columns to every indexed item at that location"""
+        def change():
+            affected = [doc for doc in self._docs.values() if doc.get('location_id') == location_id]
+            for doc in affected:
+                self._remove(doc['inventory_id'])
+                self._add(dict(doc, **values))
+        self._apply(change)
+
+    def update_fields(self, inventory_id, values):
+        """Apply changed inventory columns to one indexed item"""
+        def change():
+            doc = self._docs.get(inventory_id)
+            if doc is not None:
+                self._remove(inventory_id)
+                self._add(dict(doc, **values))
+        self._apply(change)
+
+    def search(self, query, limit=25):
+        """Rank documents matching every query token; the last token also matches as a prefix.
+
+        Candidates come from the rarest token's postings; the other tokens
+        are then checked against each candidate's own token map, so the cost
+        follows the most selective term rather than the most common one.
+        Returns (total_matches, [(score, doc), ...]) with the best matches first.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return 0, []
+
+        with self._lock:
+            doc_count = max(len(self._docs), 1)
+            terms = []  # (token, is_prefix, matching terms)
+            for position, token in enumerate(tokens):
+                is_prefix = position == len(tokens) - 1
+                matches = list(self._prefix_terms(token)) if is_prefix else (
+                    [token] if token in self._postings else [])
+                if not matches:
+                    return 0, []
+                terms.append((token, is_prefix, matches))
+
+            def size(term):
+                return sum(len(self._postings[match]) for match in term[2])
+            terms.sort(key=size)
+
+            def term_score(token, match):
+                idf = math.log(1 + doc_count / len(self._postings[match]))
+                # Prefix-only matches rank below exact ones
+                return idf if match == token else idf * 0.5
+
+            token, _, matches = terms[0]
+            scores = {}
+            for match in matches:
+                factor = term_score(token, match)
+                for inventory_id, weight in self._postings[match].items():
+                    score = weight * factor
+                    if scores.get(inventory_id, 0) < score:
+                        scores[inventory_id] = score
+
+            for term in terms[1:]:
+                token, _, matches = term
+                # Intersect through whichever is cheaper: the term's postings,
+                # or a lookup of the term in each remaining candidate
+                if size(term) <= len(scores) * len(matches):
+                    term_scores = {}
+                    for match in matches:
+                        factor = term_score(token, match)
+                        for inventory_id, weight in self._postings[match].items():
+                            if inventory_id in scores:
+                                score = weight * factor
+                                if term_scores.get(inventory_id, 0) < score:
+                                    term_scores[inventory_id] = score
+                    scores = {
+                        inventory_id: scores[inventory_id] + score
+                        for inventory_id, score in term_scores.items()
+                    }
+                else:
+                    factors = [(match, term_score(token, match)) for match in matches]
+                    remaining = {}
+                    for inventory_id, score in scores.items():
+                        doc_tokens = self._doc_tokens[inventory_id]
+                        best = 0
+                        for match, factor in factors:
+                            weight = doc_tokens.get(match)
+                            if weight and weight * factor > best:
+                                best = weight * factor
+                        if best:
+                            remaining[inventory_id] = score + best
+                    scores = remaining
+                if not scores:
+                    return 0, []
+
+            best = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+            return len(scores), [
+                (round(score, 4), self._docs[inventory_id]) for inventory_id, score in best
+            ]
+
+    def _prefix_terms(self, prefix):
+        vocabulary = self._vocabulary
+        index = bisect_left(vocabulary, prefix)
+        while index < len(vocabulary) and vocabulary[index].startswith(prefix):
+            yield vocabulary[index]
+            index += 1
+
+    def _apply(self, change):
+        with self._lock:
+            change()
+            if self._replay is not None:
+                self._replay.append(change)
+
+    def _add(self, doc):
+        inventory_id = doc['inventory_id']
+        tokens = document_tokens(doc)
+        self._docs[inventory_id] = doc
+        self._doc_tokens[inventory_id] = tokens
+        for token, weight in tokens.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                insort(self._vocabulary, token)
+            postings[inventory_id] = weight
+
+    def _remove(self, inventory_id):
+        self._docs.pop(inventory_id, None)
+        for token in self._doc_tokens.pop(inventory_id, {}):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(inventory_id, None)
+            if not postings:
+                del self._postings[token]
+                index = bisect_left(self._vocabulary, token)
+                if index < len(self._vocabulary) and self._vocabulary[index] == token:
+                    del self._vocabulary[index]
+
+
+inventory_index = InventoryIndex()
+_build_lock = threading.Lock()
+
+
+def get_index():
+    """Return the shared index, building it first if it has never been built.
+
+    A stale index (older than SEARCH_INDEX_TTL) is still served while a
+    background thread rebuilds it.
+    """
+    if inventory_index.built_at is None:
+        with _build_lock:
+            if inventory_index.built_at is None:
+                _build()
+    elif _is_stale():
+        preload()
+    return inventory_index
+
+
+def preload():
+    """Build the index in a background thread, unless a build is already running"""
+    if not _build_lock.acquire(blocking=False):
+        return None
+    thread = threading.Thread(target=_background_build, name='search-index-build', daemon=True)
+    thread.start()
+    return thread
+
+
+def _background_build():
+    try:
+        _build()
+    except Exception as e:
+        print(f"Search index build failed: {str(e)}")
+    finally:
+        _build_lock.release()
+
+
+def _build():
+    conn = get_pool().acquire()
+    try:
+        inventory_index.build(conn.cursor())
+    finally:
+        conn.close()
+
+
+def _is_stale():
+    return bool(config.SEARCH_INDEX_TTL) and time.monotonic() - inventory_index.built_at > config.SEARCH_INDEX_TTL
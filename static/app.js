@@ -85,3 +85,53 @@ async function loadAuditLog(assetTag) {
         alert('Error loading audit log');
     }
 }
+
+// Typeahead suggestions for form fields, served from /api/suggest/<field>
+const SUGGEST_INPUTS = {
+    siteName: 'site_name',
+    roomNumber: 'room_number',
+    model: 'model',
+    assetType: 'asset_type',
+    assignedTo: 'assigned_to'
+};
+
+function attachSuggestions(inputId, field) {
+    const input = document.getElementById(inputId);
+    if (!input) {
+        return;
+    }
+    
+    const datalist = document.createElement('datalist');
+    datalist.id = `${inputId}Suggestions`;
+    input.after(datalist);
+    input.setAttribute('list', datalist.id);
+    input.setAttribute('autocomplete', 'off');
+    
+    let pending = null;
+    input.addEventListener('input', () => {
+        clearTimeout(pending);
+        pending = setTimeout(async () => {
+            try {
+                const prefix = encodeURIComponent(input.value);
+                const response = await fetch(`/api/suggest/${field}?prefix=${prefix}&limit=10`);
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                const suggestions = await response.json();
+                
+                datalist.innerHTML = '';
+                suggestions.forEach(suggestion => {
+                    const option = document.createElement('option');
+                    option.value = suggestion.value;
+                    datalist.appendChild(option);
+                });
+            } catch (error) {
+                console.error('Error loading suggestions:', error);
+            }
+        }, 150);
+    });
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    Object.entries(SUGGEST_INPUTS).forEach(([inputId, field]) => attachSuggestions(inputId, field));
+});
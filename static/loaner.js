@@ -9,7 +9,7 @@ async function loadAvailableLoaners() {
         
         const tbody = document.querySelector('#available-items tbody');
         tbody.innerHTML = items.map(item => `
-            <tr>
+            <tr data-inventory-id="${item.inventory_id}">
                 <td>${item.asset_tag || ''}</td>
                 <td>${item.asset_type || ''}</td>
                 <td>${item.model || ''}</td>
@@ -38,7 +38,7 @@ async function loadCheckedOutItems() {
         
         const tbody = document.querySelector('#checked-out-items tbody');
         tbody.innerHTML = items.map(item => `
-            <tr>
+            <tr data-checkout-id="${item.checkout_id}">
                 <td>${item.asset_tag || ''}</td>
                 <td>${item.asset_type || ''}</td>
                 <td>${item.model || ''}</td>
@@ -63,6 +63,34 @@ async function loadCheckedOutItems() {
     }
 }
 
+// Keep both tables current from the server's change feed
+function removeRow(tableId, attribute, value) {
+    const row = document.querySelector(`#${tableId} tbody tr[${attribute}="${value}"]`);
+    if (row) row.remove();
+}
+
+function connectEvents() {
+    if (!window.EventSource) return;
+    const events = new EventSource('/api/events');
+
+    events.addEventListener('loaner.checkout', (e) => {
+        const change = JSON.parse(e.data);
+        removeRow('available-items', 'data-inventory-id', change.inventory_id);
+        loadCheckedOutItems();
+    });
+    events.addEventListener('loaner.checkin', (e) => {
+        const change = JSON.parse(e.data);
+        removeRow('checked-out-items', 'data-checkout-id', change.checkout_id);
+        loadAvailableLoaners();
+    });
+    ['hardware.loaner_flag', 'reset'].forEach(type => {
+        events.addEventListener(type, () => {
+            loadAvailableLoaners();
+            loadCheckedOutItems();
+        });
+    });
+}
+
 // Show checkout modal
 function showCheckoutModal(inventoryId, assetTag) {
     document.getElementById('checkout-inventory-id').value = inventoryId;
@@ -92,6 +120,7 @@ document.addEventListener('DOMContentLoaded', () => {
     // Load initial data
     loadAvailableLoaners();
     loadCheckedOutItems();
+    connectEvents();
     
     // Set up tab switching
     document.querySelectorAll('.tab-button').forEach(button => {
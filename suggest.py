@@ -0,0 +1,175 @@
+"""Prefix-trie typeahead for the hardware and location form fields.
+
+One PrefixTrie per field maps every distinct value (case-insensitively) to
+how often it occurs. Each trie node caches its most frequent completions,
+and an update only clears the caches on the path to the changed key, so
+suggestions never need SQL Server. The tries are loaded once and then
+adjusted by the write paths through add() / remove().
+"""
+import heapq
+import threading
+import time
+
+import config
+from db_pool import get_pool
+
+# Field -> query producing (value, occurrences)
+FIELD_QUERIES = {
+    'site_name': "SELECT site_name, COUNT(*) FROM dbo.Locations GROUP BY site_name",
+    'room_number': "SELECT room_number, COUNT(*) FROM dbo.Locations GROUP BY room_number",
+    'model': "SELECT model, COUNT(*) FROM dbo.Formatted_Company_Inventory GROUP BY model",
+    'asset_type': "SELECT asset_type, COUNT(*) FROM dbo.Formatted_Company_Inventory GROUP BY asset_type",
+    'assigned_to': "SELECT assigned_to, COUNT(*) FROM dbo.Formatted_Company_Inventory GROUP BY assigned_to",
+}
+
+CACHED_COMPLETIONS = 10  # completions remembered per node; larger limits walk the subtree
+
+
+class _Node:
+    __slots__ = ('children', 'value', 'count', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.value = None  # display form of the key ending here
+        self.count = 0
+        self.top = None    # cached [(count, value)] best completions, or None
+
+
+class PrefixTrie:
+    def __init__(self):
+        self._root = _Node()
+        self._lock = threading.Lock()
+
+    def add(self, value, count=1):
+        """Record `count` more occurrences of value (negative counts remove them)"""
+        if value is None or not str(value).strip():
+            return
+        value = str(value).strip()
+        with self._lock:
+            node = self._root
+            node.top = None
+            for char in value.casefold():
+                node = node.children.setdefault(char, _Node())
+                node.top = None
+            node.count = max(node.count + count, 0)
+            if count > 0 or node.value is None:
+                node.value = value
+
+    def remove(self, value, count=1):
+        self.add(value, -count)
+
+    def suggest(self, prefix, limit=10):
+        """Most frequent values starting with prefix, as [(value, count)]"""
+        with self._lock:
+            node = self._root
+            for char in (prefix or '').strip().casefold():
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            if limit <= CACHED_COMPLETIONS:
+                if node.top is None:
+                    node.top = self._best(node, CACHED_COMPLETIONS)
+                best = node.top[:limit]
+            else:
+                best = self._best(node, limit)
+            return [(value, count) for count, value in best]
+
+    def _best(self, node, limit):
+        entries = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.count > 0:
+                entries.append((current.count, current.value))
+            stack.extend(current.children.values())
+        return heapq.nlargest(limit, entries, key=lambda entry: (entry[0], _reverse_key(entry[1])))
+
+
+def _reverse_key(value):
+    # Ties on count go to the alphabetically first value (the trailing 0 ranks "a" above "ab")
+    return [-ord(char) for char in value.casefold()] + [0]
+
+
+tries = {field: PrefixTrie() for field in FIELD_QUERIES}
+_loaded_at = None
+_load_lock = threading.Lock()
+_replay = None  # writes recorded while a load is reading, re-applied after it
+_replay_lock = threading.Lock()
+
+
+def load(cursor):
+    """Replace every trie with fresh counts from the database"""
+    global tries, _loaded_at, _replay
+    with _replay_lock:
+        _replay = []
+    fresh = {}
+    try:
+        for field, query in FIELD_QUERIES.items():
+            trie = PrefixTrie()
+            cursor.execute(query)
+            for value, count in cursor.fetchall():
+                trie.add(value, count)
+            fresh[field] = trie
+    finally:
+        with _replay_lock:
+            replay, _replay = _replay, None
+            if len(fresh) == len(FIELD_QUERIES):
+                # The load may have read counts from before these writes committed
+                for field, old_value, new_value in replay:
+                    _apply(fresh[field], old_value, new_value)
+                tries = fresh
+                _loaded_at = time.monotonic()
+
+
+def suggest(field, prefix, limit=10):
+    """Suggestions for a field, loading the tries first if needed"""
+    if _loaded_at is None:
+        with _load_lock:
+            if _loaded_at is None:
+                _load()
+    elif config.SUGGEST_TTL and time.monotonic() - _loaded_at > config.SUGGEST_TTL:
+        preload()
+    return tries[field].suggest(prefix, limit)
+
+
+def record(field, old_value=None, new_value=None):
+    """Move one occurrence of a field from old_value to new_value after a write"""
+    if field not in tries or old_value == new_value:
+        return
+    with _replay_lock:
+        _apply(tries[field], old_value, new_value)
+        if _replay is not None:
+            _replay.append((field, old_value, new_value))
+
+
+def _apply(trie, old_value, new_value):
+    if old_value is not None:
+        trie.remove(old_value)
+    if new_value is not None:
+        trie.add(new_value)
+
+
+def preload():
+    """Reload the tries in a background thread, unless a load is already running"""
+    if not _load_lock.acquire(blocking=False):
+        return None
+    thread = threading.Thread(target=_background_load, name='suggest-load', daemon=True)
+    thread.start()
+    return thread
+
+
+def _background_load():
+    try:
+        _load()
+    except Exception as e:
+        print(f"Suggestion trie load failed: {str(e)}")
+    finally:
+        _load_lock.release()
+
+
+def _load():
+    conn = get_pool().acquire()
+    try:
+        load(conn.cursor())
+    finally:
+        conn.close()
@@ -1,3 +1,4 @@
+import json
 import os
 import pyodbc
 from datetime import datetime
@@ -47,3 +48,43 @@ def log_change(cursor, asset_tag, action_type, field_name, old_value, new_value,
         str(new_value) if new_value is not None else None,
         changed_by
     ))
+
+def log_changes(cursor, entries):
+    """Log many changes in one INSERT; each entry is a dict of log_change's arguments.
+
+    An entry may also carry `changed_at` (ISO format); entries without one get GETDATE().
+    """
+    if not entries:
+        return
+    rows = [{
+        'asset_tag': entry['asset_tag'],
+        'action_type': entry['action_type'],
+        'field_name': entry['field_name'],
+        'old_value': str(entry['old_value']) if entry.get('old_value') is not None else None,
+        'new_value': str(entry['new_value']) if entry.get('new_value') is not None else None,
+        'changed_by': entry['changed_by'],
+        'changed_at': entry.get('changed_at')
+    } for entry in entries]
+    # The rows travel as one JSON parameter, so the batch size is not bound
+    # by SQL Server's 2100-parameter limit
+    cursor.execute('''
+        INSERT INTO dbo.AuditLog (
+            asset_tag,
+            changed_at,
+            action_type,
+            field_name,
+            old_value,
+            new_value,
+            changed_by
+        )
+        SELECT asset_tag, COALESCE(changed_at, GETDATE()), action_type, field_name, old_value, new_value, changed_by
+        FROM OPENJSON(?) WITH (
+            asset_tag NVARCHAR(4000),
+            action_type NVARCHAR(4000),
+            field_name NVARCHAR(4000),
+            old_value NVARCHAR(MAX),
+            new_value NVARCHAR(MAX),
+            changed_by NVARCHAR(4000),
+            changed_at DATETIME2
+        )
+    ''', json.dumps(rows))